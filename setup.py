@@ -138,6 +138,12 @@ def main():
     # 3. Dependencies
     print_step("Installing Standard Requirements")
     run_pip_install(["customtkinter", "matplotlib", "pandas", "numpy"])
+    # Optional: columnar snapshot of the data (src/snapshot.py), the app works without it
+    if not run_pip_install("pyarrow"):
+        print("    -> Continuing without the data snapshot.")
+    # Optional: columnar query backend (src/query_backend.py), SQLite is used without it
+    if not run_pip_install("duckdb"):
+        print("    -> Continuing with the SQLite query backend only.")
 
     # 4. AI Engine
     try:
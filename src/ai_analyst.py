@@ -1,92 +1,408 @@
-import os
-from pathlib import Path
-
-# Robust path finding
-current_path = Path(__file__).resolve()
-BASE_DIR = current_path.parent.parent
-# Check logic for 'models' folder in various locations
-possible_paths = [
-    current_path.parent / "models", # Same folder/models
-    BASE_DIR / "models",            # Parent/models
-    BASE_DIR / "src" / "models"     # Explicit src/models
-]
-
-MODELS_DIR = None
-for p in possible_paths:
-    if p.exists():
-        MODELS_DIR = p
-        break
-
-try:
-    from llama_cpp import Llama
-    AI_AVAILABLE = True
-except ImportError:
-    print("WARNING: 'llama-cpp-python' not found. AI disabled.")
-    AI_AVAILABLE = False
-    Llama = None
+# Dashboard side of the AI analyst.
+# The model lives in a separate inference process (ai_worker.py) that serves a priority queue of
+# requests; this class starts it, sends prompts, gets the tokens back over a pipe and keeps an eye on it.
+# A generation that crashes the process or hangs past its timeout only costs that request: the worker
+# is restarted and the dashboard carries on.
+
+import itertools
+import json
+import multiprocessing
+import queue
+import threading
+import time
+from collections import deque
+
+import ai_worker
+import perf
+from ai_engine import BASE_DIR, GENERATION_PARAMS, MODEL_FILENAME, MODEL_PATH, build_prompt
+from prompt_builder import MIN_ANSWER_TOKENS, PACKING_VERSION, SAFETY_TOKENS
+from response_cache import ResponseCache, make_key
+
+# Finished analyses are kept on disk next to the data cache (see response_cache.py)
+RESPONSE_CACHE_DIR = BASE_DIR / "cache" / "ai_responses"
+# The prompt around a request, part of the response cache key so a changed template doesn't serve old answers
+PROMPT_TEMPLATE = build_prompt("{system}", "{context}", "{tables}")
+
+# Model life cycle (AIAnalyst.state)
+STATE_NOT_LOADED = "not_loaded"
+STATE_LOADING = ai_worker.STATE_LOADING
+STATE_READY = ai_worker.STATE_READY
+STATE_FAILED = ai_worker.STATE_FAILED
+
+# Request priorities, lower goes first. A click on the AI button jumps ahead of a running batch.
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 10
+
+# Generation is stopped after this many seconds (checked by the worker after every token)
+REQUEST_TIMEOUT_S = 300
+# If the worker is still silent this long after a request's timeout it is considered stuck and killed
+WATCHDOG_GRACE_S = 30
+WATCHDOG_INTERVAL_S = 0.5
+
+_END = object()
+
+
+class AIRequest:
+    """Handle for one submitted analysis. Iterate it for the text pieces, or drain() it from a poll loop."""
+
+    def __init__(self, analyst, request_id, timeout=None):
+        self.analyst = analyst
+        self.request_id = request_id
+        self.timeout = timeout
+        self.cache_key = None
+        self.payload = None
+        self.regenerate = False
+        self.started = False # the worker began generating it
+        self.parts = []
+        self.reason = None # complete / cancelled / timeout / cached / error
+        self.finished = threading.Event()
+        self._queue = queue.Queue()
+
+    @property
+    def text(self):
+        return "".join(self.parts)
+
+    def cancel(self):
+        if not self.finished.is_set():
+            self.analyst.cancel(self.request_id)
+
+    def drain(self):
+        # Non-blocking: everything received so far, and whether the request is over
+        pieces = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return "".join(pieces), False
+            if item is _END:
+                return "".join(pieces), True
+            pieces.append(item)
+
+    def __iter__(self):
+        try:
+            while True:
+                item = self._queue.get()
+                if item is _END:
+                    return
+                yield item
+        finally:
+            # Consumer stopped early (closed generator), no point generating the rest
+            self.cancel()
+
+    def _put(self, text):
+        self.parts.append(text)
+        self._queue.put(text)
+
+    def _close(self, reason):
+        self.reason = reason
+        self.finished.set()
+        self._queue.put(_END)
+
 
 class AIAnalyst:
+    # The worker (and the model) is NOT started in __init__: the dashboard calls load_async() once the window is up,
+    # and the first request starts it otherwise. Requests made while it loads are queued in the worker.
     def __init__(self):
-        self.llm = None
-        self.model_filename = "gemma-3-4b-it-Q4_K_M.gguf"
-        
-        if not AI_AVAILABLE:
-            return
+        self.model_filename = MODEL_FILENAME
+        self.model_path = MODEL_PATH
+
+        self.state = STATE_NOT_LOADED
+        self.error = None
+        self._state_lock = threading.Lock()
+        self._listeners = []
+
+        # Sampling settings, sent with every request and part of the response cache key
+        self.generation_params = dict(GENERATION_PARAMS)
+        self.response_cache = ResponseCache(RESPONSE_CACHE_DIR)
+        # SHA-256 of the model file, part of the cache key. Hashing a multi-GB file takes a while, so it
+        # runs on a helper thread; requests made before it is known skip the lookup until then.
+        self._model_identity = None
+        self._identity_thread = None
+        # Context size of the loaded model, reported by the worker: it decides how much report data is packed
+        self._n_ctx = None
+
+        # Inference process and the requests it still owes an answer
+        self.process = None
+        self._requests = None
+        self._jobs = {}
+        self._active = None # (request_id, kill deadline) of the request the worker is generating
+        self._ids = itertools.count(1)
+        self._jobs_lock = threading.Lock()
+        self._stopping = False
+        self.restarts = 0
+        self._load_started = None
+
+        # Per-request timings (time to first token, tokens/sec), newest last
+        self.last_stats = None
+        self.stats_history = deque(maxlen=50)
+
+    def add_listener(self, callback):
+        # callback(state) is called from a background thread on every state change
+        self._listeners.append(callback)
+
+    def _set_state(self, state):
+        self.state = state
+        for callback in self._listeners:
+            try:
+                callback(state)
+            except Exception as e:
+                print(f"AI state listener failed: {e}")
+
+    def load_async(self):
+        self._start_identity()
+        with self._state_lock:
+            if self.state != STATE_NOT_LOADED or self._stopping:
+                return
+            self._set_state(STATE_LOADING)
+        with self._jobs_lock:
+            self._start_worker()
+
+    def _start_worker(self):
+        # spawn, not fork: forking a process that runs Tk is not safe
+        ctx = multiprocessing.get_context("spawn")
+        self._requests = ctx.Queue()
+        receiver, sender = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(target=ai_worker.serve, args=(self._requests, sender), name="ai-worker", daemon=True)
+        self._load_started = time.perf_counter()
+        self.process.start()
+        sender.close() # only the worker writes to it
+        threading.Thread(target=self._read_results, args=(self.process, receiver), daemon=True).start()
+
+    def _read_results(self, process, conn):
+        while True:
+            try:
+                if conn.poll(WATCHDOG_INTERVAL_S):
+                    message = conn.recv()
+                    job = self._jobs.get(message[1]) if message[0] in ("start", "token", "done") else None
+                    try:
+                        self._handle(message)
+                    except Exception as e:
+                        self._handle_failed(message, job, e)
+                    continue
+            except (EOFError, OSError):
+                why = "stopped unexpectedly"
+                break
 
-        if MODELS_DIR is None:
-            print("ERROR: 'models' directory not found.")
+            # Watchdog
+            if not process.is_alive():
+                why = f"crashed (exit code {process.exitcode})"
+                break
+            active = self._active
+            if active and active[1] is not None and time.monotonic() > active[1]:
+                why = "got stuck and was restarted"
+                print(f"AI worker: request {active[0]} is stuck, killing the worker.")
+                process.kill()
+                break
+
+        process.join(timeout=5)
+        conn.close()
+        self._worker_lost(why)
+
+    def _handle(self, message):
+        kind = message[0]
+        if kind == "state":
+            _, state, error = message
+            if state == STATE_LOADING:
+                return
+            perf.record("ai.model_load", self._load_started, time.perf_counter(), tid=self.process.pid, state=state)
+            self.error = error
+            self._set_state(state)
+            if state == STATE_READY:
+                self._lookup_pending()
+        elif kind == "engine":
+            self._n_ctx = message[1]["n_ctx"]
+        elif kind == "start":
+            job = self._jobs.get(message[1])
+            if job is not None:
+                job.started = True
+                deadline = time.monotonic() + job.timeout + WATCHDOG_GRACE_S if job.timeout else None
+                self._active = (job.request_id, deadline)
+        elif kind == "token":
+            job = self._jobs.get(message[1])
+            if job is not None:
+                job._put(message[2])
+        elif kind == "done":
+            _, request_id, stats, reason = message
+            with self._jobs_lock:
+                job = self._jobs.pop(request_id, None)
+            self._active = None
+            if job is not None:
+                self._finish(job, stats, reason)
+
+    def _handle_failed(self, message, job, error):
+        # E.g. the response cache on a full disk: only the request the message was about fails, this thread
+        # has to keep reading or every other request would wait forever
+        print(f"AI: handling the worker's '{message[0]}' message failed: {error}")
+        if job is None or job.finished.is_set():
             return
+        with self._jobs_lock:
+            if self._jobs.pop(job.request_id, None) is job and message[0] != "done":
+                self._requests.put(("cancel", job.request_id))
+        job._put(f"Error: the AI answer could not be handled ({error}).")
+        job._close("error")
+
+    def _finish(self, job, stats, reason):
+        if stats:
+            self.last_stats = stats
+            self.stats_history.append(stats)
+            self._record_spans(stats, reason)
+        if reason == "timeout":
+            job._put(f"\n\n[Analysis stopped after {job.timeout}s.]")
 
-        self.model_path = MODELS_DIR / self.model_filename
-        
-        if not self.model_path.exists():
-            print(f"ERROR: Model file missing at {self.model_path}")
-            print("Please download the .gguf model and place it in the 'models' folder.")
+        response = job.text.strip()
+        if reason == "complete" and job.cache_key is None:
+            job.cache_key = self._cache_key(job.payload)
+        if reason == "complete" and job.cache_key and response and not response.startswith("Generation Error"):
+            self.response_cache.put(job.cache_key, response, {"model": self.model_filename})
+        job._close(reason)
+
+    def _record_spans(self, stats, reason):
+        # The worker's timings as spans on their own track, placed backwards from now
+        if not perf.is_enabled() or stats.get("total_s") is None:
             return
+        end = time.perf_counter()
+        start = end - stats["total_s"]
+        tid = self.process.pid if self.process else None
+        perf.record("ai.pack", start - stats.get("pack_s", 0.0), start, tid=tid, prompt_tokens=stats.get("prompt_tokens"))
+        if stats.get("ttft_s") is not None:
+            perf.record("ai.prompt_eval", start, start + stats["ttft_s"], tid=tid, prefix=stats.get("prefix"))
+            perf.record("ai.decode", start + stats["ttft_s"], end, tid=tid, tokens=stats.get("tokens"),
+                        tokens_per_s=stats.get("tokens_per_s"), reason=reason)
 
-        try:
-            print(f"Loading AI Model from {self.model_path}...")
-            # n_gpu_layers=-1 attempts to use GPU. If no GPU, it naturally falls back to CPU.
-            self.llm = Llama(
-                model_path=str(self.model_path),
-                n_ctx=2048,      
-                n_batch=512, 
-                n_gpu_layers=-1, 
-                verbose=False     
-            )
-            print("AI Engine Online.")
-
-        except Exception as e:
-            print(f"AI Initialization Failed: {e}")
-            self.llm = None
-
-    def analyze(self, system_instructions, data_context):
-        if not self.llm:
-            if not AI_AVAILABLE:
-                return "Error: AI Library not installed. Please run setup.py."
-            return "Error: AI Model not loaded. Check console for 'models' folder path."
-        
-        full_prompt = f"""<start_of_turn>user
-            INSTRUCTIONS: {system_instructions}
-            STRICT CONTEXT DATA:
-            {data_context}
-            TASK:
-            Provide a concise, professional analysis. 
-            1. Highlight the most critical metric.
-            2. Identify a potential cause.
-            3. Recommend one actionable step.
-            Keep it under 300 words.<end_of_turn>
-            <start_of_turn>model
+    def _worker_lost(self, why):
+        if self.state == STATE_FAILED:
+            message = self.error # model never loaded, the worker exits on its own
+        else:
+            message = f"Error: the AI worker {why}. Please try again."
+            if not self._stopping:
+                print(message)
+
+        with self._state_lock:
+            # Had a working model before: bring it back right away so the next click doesn't wait for a load
+            restart = self.state == STATE_READY and not self._stopping
+            if self.state == STATE_LOADING:
+                self.error = f"Error: the AI worker {why} while loading the model."
+                self._set_state(STATE_FAILED)
+            elif self.state == STATE_READY:
+                self._set_state(STATE_LOADING if restart else STATE_NOT_LOADED)
+
+        # Same lock as submit(): a request goes either to the dead worker (and is failed below) or the new one
+        with self._jobs_lock:
+            jobs, self._jobs = self._jobs, {}
+            self._active = None
+            if restart:
+                self.restarts += 1
+                self._start_worker()
+
+        for job in jobs.values():
+            job._put(message)
+            job._close("error")
+
+    def submit(self, system_instructions, data_context, regenerate=False, priority=PRIORITY_INTERACTIVE,
+               timeout=REQUEST_TIMEOUT_S, tables=None):
+        """
+        Queues an analysis and returns its AIRequest right away.
+        tables: report tables from prompt_builder.table_payload, the worker packs as many rows as fit the context.
+        A previous answer to the exact same request is returned from disk unless regenerate=True.
         """
-        
+        payload = {"system": system_instructions, "context": data_context, "tables": tables or []}
+        job = AIRequest(self, next(self._ids), timeout)
+        job.payload = payload
+        job.regenerate = regenerate
+
+        # None until the model is hashed and the worker reported its context size, the lookup is retried then (_lookup_pending)
+        job.cache_key = self._cache_key(payload)
+        if job.cache_key and not regenerate:
+            cached = self.response_cache.get(job.cache_key)
+            if cached is not None:
+                self._serve_cached(job, cached)
+                return job
+
+        self.load_async()
+        if self.state == STATE_FAILED:
+            job._put(self.error)
+            job._close("error")
+            return job
+
+        with self._jobs_lock:
+            self._jobs[job.request_id] = job
+            self._requests.put(("request", job.request_id, priority, payload, self.generation_params, timeout))
+        return job
+
+    def cancel(self, request_id):
+        with self._jobs_lock:
+            known = request_id in self._jobs
+        if known and self._requests is not None:
+            self._requests.put(("cancel", request_id))
+
+    def analyze(self, system_instructions, data_context, regenerate=False, priority=PRIORITY_INTERACTIVE, tables=None):
+        return "".join(self.analyze_stream(system_instructions, data_context, regenerate, priority, tables)).strip()
+
+    def analyze_stream(self, system_instructions, data_context, regenerate=False, priority=PRIORITY_INTERACTIVE, tables=None):
+        """
+        Yields the answer piece by piece as the worker produces tokens.
+        Timing of every request ends up in self.last_stats / self.stats_history.
+        """
+        yield from self.submit(system_instructions, data_context, regenerate, priority, tables=tables)
+
+    def shutdown(self):
+        self._stopping = True
+        process = self.process
+        if process is None or not process.is_alive():
+            return
+        self._requests.put(("stop",))
+        process.join(timeout=2)
+        if process.is_alive():
+            process.kill()
+
+    def _serve_cached(self, job, cached):
+        print("AI: answer served from the response cache.")
+        self.last_stats = {"cached": True}
+        job._put(cached)
+        job._close("cached")
+
+    def _start_identity(self):
+        with self._state_lock:
+            if self._identity_thread is not None or self.model_path is None or not self.model_path.exists():
+                return
+            self._identity_thread = threading.Thread(target=self._compute_identity, name="ai-model-hash", daemon=True)
+            self._identity_thread.start()
+
+    def _compute_identity(self):
         try:
-            output = self.llm(
-                full_prompt,
-                max_tokens=900,
-                temperature=0.3,
-                stop=["<end_of_turn"]
-            )
-            return output['choices'][0]['text'].strip()
-            
-        except Exception as e:
-            return f"Generation Error: {str(e)}"
\ No newline at end of file
+            self._model_identity = self.response_cache.model_identity(self.model_path)
+        except OSError as e:
+            print(f"AI: could not hash the model file, answers are not cached ({e}).")
+            return
+        self._lookup_pending()
+
+    def _lookup_pending(self):
+        # Requests submitted before their cache key was known: answered from disk if the worker hasn't started them
+        with self._jobs_lock:
+            waiting = [job for job in self._jobs.values() if job.cache_key is None and not job.started]
+        for job in waiting:
+            job.cache_key = self._cache_key(job.payload)
+            if job.cache_key is None or job.regenerate:
+                continue
+            cached = self.response_cache.get(job.cache_key)
+            if cached is None:
+                continue
+            with self._jobs_lock:
+                if job.started or self._jobs.get(job.request_id) is not job:
+                    continue
+                del self._jobs[job.request_id]
+                self._requests.put(("cancel", job.request_id))
+            self._serve_cached(job, cached)
+
+    def _cache_key(self, payload):
+        # Keyed on the request and everything that packs it into the prompt (template, packing rules and the
+        # model's context size), so None until the worker reported n_ctx as well
+        if self._model_identity is None or self._n_ctx is None:
+            return None
+        prompt = {
+            "request": payload,
+            "template": PROMPT_TEMPLATE,
+            "packing": {"version": PACKING_VERSION, "n_ctx": self._n_ctx, "min_answer_tokens": MIN_ANSWER_TOKENS,
+                        "safety_tokens": SAFETY_TOKENS},
+        }
+        return make_key(json.dumps(prompt, sort_keys=True), self._model_identity, self.generation_params)
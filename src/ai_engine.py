@@ -0,0 +1,214 @@
+# The llama.cpp side of the AI analyst: model loading, prompt layout, prefix KV reuse and generation.
+# Only ai_worker.py (the inference process) and bench_ai.py use this directly, the dashboard talks
+# to the worker through AIAnalyst (ai_analyst.py) so llama_cpp is never imported in the UI process.
+
+import time
+from pathlib import Path
+
+from prompt_builder import PromptBuilder
+
+# Robust path finding
+current_path = Path(__file__).resolve()
+BASE_DIR = current_path.parent.parent
+# Check logic for 'models' folder in various locations
+possible_paths = [
+    current_path.parent / "models", # Same folder/models
+    BASE_DIR / "models",            # Parent/models
+    BASE_DIR / "src" / "models"     # Explicit src/models
+]
+
+MODELS_DIR = None
+for p in possible_paths:
+    if p.exists():
+        MODELS_DIR = p
+        break
+
+MODEL_FILENAME = "gemma-3-4b-it-Q4_K_M.gguf"
+MODEL_PATH = MODELS_DIR / MODEL_FILENAME if MODELS_DIR else None
+
+# Sampling settings, also part of the response cache key.
+# max_tokens is the upper limit, each request gets what is left of the context (see prompt_builder.py)
+GENERATION_PARAMS = {"max_tokens": 900, "temperature": 0.3, "stop": ["<end_of_turn"]}
+
+# Fixed start of every prompt. Keeping everything that never changes in front of the
+# report-specific part means llama.cpp can keep this part evaluated in its KV cache and
+# only process INSTRUCTIONS / STRICT CONTEXT DATA for each analysis.
+PROMPT_PREFIX = """<start_of_turn>user
+TASK:
+Provide a concise, professional analysis of the report described below.
+1. Highlight the most critical metric.
+2. Identify a potential cause.
+3. Recommend one actionable step.
+Keep it under 300 words.
+"""
+
+
+def build_prompt(system_instructions, data_context, tables_text=""):
+    if tables_text:
+        data_context = f"{data_context}\nDATA TABLES (most important rows first):\n{tables_text}"
+    return PROMPT_PREFIX + f"""INSTRUCTIONS: {system_instructions}
+STRICT CONTEXT DATA:
+{data_context}<end_of_turn>
+<start_of_turn>model
+"""
+
+
+def create_llama(model_path, settings, draft_model=None):
+    from llama_cpp import Llama
+    return Llama(model_path=str(model_path), verbose=False, draft_model=draft_model, **settings)
+
+
+class LlamaEngine:
+    def __init__(self, model_path=MODEL_PATH, generation_params=None, speculative=None):
+        self.llm = None
+        self.error = None
+        self.settings = None
+        self.model_path = model_path
+        # None = whatever models/llm_config.json says (see ai_speculative.py), after loading: the mode in use
+        self.speculative = speculative
+        self.generation_params = dict(generation_params or GENERATION_PARAMS)
+
+        # Evaluated PROMPT_PREFIX, restored into the context whenever another prompt overwrote it
+        self.reuse_prefix = True
+        self._prefix_tokens = None
+        self._prefix_state = None
+
+    def load(self):
+        self.llm = self._create_llm()
+        return self.llm is not None
+
+    def _create_llm(self):
+        try:
+            import llama_cpp # only checking that it is installed, create_llama() does the real import
+        except ImportError:
+            print("WARNING: 'llama-cpp-python' not found. AI disabled.")
+            self.error = "Error: AI Library not installed. Please run setup.py."
+            return None
+
+        if MODELS_DIR is None:
+            print("ERROR: 'models' directory not found.")
+            self.error = "Error: AI Model not loaded. Check console for 'models' folder path."
+            return None
+
+        if not self.model_path.exists():
+            print(f"ERROR: Model file missing at {self.model_path}")
+            print("Please download the .gguf model and place it in the 'models' folder.")
+            self.error = "Error: AI Model not loaded. Check console for 'models' folder path."
+            return None
+
+        try:
+            # Threads / batch / context are tuned for this machine on the first run (see ai_tuning.py)
+            from ai_tuning import resolve_settings
+            self.settings = resolve_settings(self.model_path)
+
+            # Optional draft for speculative decoding, falls back to plain decoding on its own
+            from ai_speculative import check_draft, make_draft
+            draft, self.speculative = make_draft(self.settings, self.speculative)
+
+            print(f"Loading AI Model from {self.model_path}...")
+            llm = create_llama(self.model_path, self.settings, draft)
+            if not check_draft(llm, draft):
+                self.speculative = "off"
+            print(f"AI Engine Online ({self.settings}, speculative decoding: {self.speculative}).")
+            return llm
+
+        except Exception as e:
+            print(f"AI Initialization Failed: {e}")
+            self.error = f"Error: AI Model failed to load ({e})."
+            return None
+
+    def count_tokens(self, text):
+        return len(self.llm.tokenize(text.encode("utf-8"), add_bos=True, special=True))
+
+    def pack(self, payload, params=None):
+        """
+        Builds the prompt for a request payload ({"system", "context", "tables"}) so it fits the context.
+        Returns (prompt, params with max_tokens set from what is left of the context, info).
+        """
+        params = dict(params or self.generation_params)
+        builder = PromptBuilder(self.count_tokens, self.llm.n_ctx(), build_prompt, max_answer_tokens=params["max_tokens"])
+        prompt, params["max_tokens"], info = builder.build(payload["system"], payload["context"], payload.get("tables"))
+        return prompt, params, info
+
+    def prompt_tokens(self, full_prompt):
+        # Prefix and suffix are tokenized separately so the prompt always starts with exactly
+        # the cached prefix tokens (no token merging across the boundary).
+        if self._prefix_tokens is None:
+            self._prefix_tokens = self.llm.tokenize(PROMPT_PREFIX.encode("utf-8"), add_bos=True, special=True)
+        suffix = full_prompt[len(PROMPT_PREFIX):]
+        return self._prefix_tokens + self.llm.tokenize(suffix.encode("utf-8"), add_bos=False, special=True)
+
+    def _restore_prefix(self):
+        """
+        Makes the context start with the evaluated prefix again.
+        The first call evaluates it and saves the state, later calls only load that state back
+        when the context doesn't already begin with it. llama.cpp then skips every token of the
+        new prompt that matches what is already in the context.
+        """
+        llm = self.llm
+        n = len(self._prefix_tokens)
+        if llm.n_tokens >= n and list(llm.input_ids[:n]) == self._prefix_tokens:
+            return "kept"
+
+        if self._prefix_state is not None:
+            llm.load_state(self._prefix_state)
+            return "restored"
+
+        llm.reset()
+        llm.eval(self._prefix_tokens)
+        self._prefix_state = llm.save_state()
+        return "evaluated"
+
+    def generate(self, full_prompt, stats, params=None):
+        """
+        Yields the answer piece by piece as llama.cpp produces tokens.
+        params overrides self.generation_params for this call.
+        Timings are written into the given stats dict when the generator finishes or is closed.
+        """
+        start = time.perf_counter()
+        first_token_at = None
+        n_tokens = 0
+        started_text = False
+        prefix = None
+
+        try:
+            tokens = self.prompt_tokens(full_prompt)
+            if self.reuse_prefix:
+                prefix = self._restore_prefix()
+            else:
+                self.llm.reset() # evaluate the whole prompt from scratch (for comparisons)
+
+            stream = self.llm(tokens, stream=True, **(params or self.generation_params))
+            for chunk in stream:
+                text = chunk['choices'][0]['text']
+                n_tokens += 1
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                # Same as the old .strip(): no leading whitespace before the answer starts
+                if not started_text:
+                    text = text.lstrip()
+                    started_text = bool(text)
+                if text:
+                    yield text
+
+        except Exception as e:
+            yield f"Generation Error: {str(e)}"
+
+        finally:
+            stats.update(timing_stats(start, first_token_at, n_tokens, prefix), speculative=self.speculative)
+
+
+def timing_stats(start, first_token_at, n_tokens, prefix=None):
+    end = time.perf_counter()
+    stats = {
+        "prefix": prefix,
+        "total_s": end - start,
+        # Time to first token is basically the prompt evaluation
+        "ttft_s": (first_token_at - start) if first_token_at else None,
+        "tokens": n_tokens,
+        "tokens_per_s": (n_tokens - 1) / (end - first_token_at) if first_token_at and n_tokens > 1 and end > first_token_at else None,
+    }
+    if stats["ttft_s"] is not None:
+        speed = f"{stats['tokens_per_s']:.1f} tok/s" if stats["tokens_per_s"] else "n/a"
+        print(f"AI: first token after {stats['ttft_s']:.2f}s (prefix {prefix or 'not reused'}), {n_tokens} tokens at {speed}")
+    return stats
@@ -0,0 +1,104 @@
+# Speculative decoding for the llama.cpp engine.
+# A cheap "draft" proposes the next few tokens and the main model checks them all in one batched
+# evaluation, keeping the ones it agrees with. The main model still decides every token, so the text
+# is the same as without it (up to floating point noise), only generated faster when the draft is right.
+#
+# Drafts:
+#   "draft"  - a small GGUF of the same family (same tokenizer), e.g. gemma-3-1b-it next to the 4b model
+#   "lookup" - prompt lookup decoding: proposes continuations copied from the prompt itself (product
+#              names, numbers from the tables...), no extra model needed
+#   "off"    - plain decoding
+#   "auto"   - "draft" when the draft model file is there, plain decoding otherwise (default)
+#
+# Chosen in models/llm_config.json: {"speculative": "lookup"}, {"draft_model": "other.gguf"}, {"num_pred_tokens": 6}
+# "python bench_ai.py speculative" compares the modes on this machine.
+
+import gc
+
+import numpy as np
+from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+
+from ai_engine import MODELS_DIR, create_llama
+from ai_tuning import load_config
+
+DEFAULT_MODE = "auto"
+DRAFT_MODEL_FILENAME = "gemma-3-1b-it-Q4_K_M.gguf"
+DRAFT_PRED_TOKENS = 4   # a small model is only right for a few tokens in a row
+LOOKUP_PRED_TOKENS = 10
+
+# Settings the draft model shares with the main one
+SHARED_SETTINGS = ("n_ctx", "n_batch", "n_threads", "n_threads_batch", "n_gpu_layers")
+
+
+class GGUFDraftModel(LlamaDraftModel):
+    """Greedy drafts from a second, smaller Llama that keeps its own KV cache of the same text."""
+
+    def __init__(self, llm, num_pred_tokens=DRAFT_PRED_TOKENS):
+        self.llm = llm
+        self.num_pred_tokens = num_pred_tokens
+        self.eos = llm.token_eos()
+
+    def __call__(self, input_ids, /, **kwargs):
+        drafted = []
+        # generate() only evaluates what differs from the draft's previous call (longest common prefix)
+        for token in self.llm.generate(input_ids.tolist(), temp=0.0, top_k=1, reset=True):
+            if token == self.eos:
+                break
+            drafted.append(token)
+            if len(drafted) >= self.num_pred_tokens:
+                break
+        return np.array(drafted, dtype=np.intc)
+
+
+def speculative_config(mode=None):
+    config = load_config()
+    return {
+        "mode": mode or config.get("speculative", DEFAULT_MODE),
+        "draft_model": config.get("draft_model", DRAFT_MODEL_FILENAME),
+        "num_pred_tokens": config.get("num_pred_tokens"),
+    }
+
+
+def make_draft(settings, mode=None):
+    """
+    Returns (draft or None, mode actually used). Anything that goes wrong with the draft model
+    (missing file, failed load) falls back to plain decoding instead of failing the engine.
+    """
+    config = speculative_config(mode)
+    mode = config["mode"]
+    draft_path = MODELS_DIR / config["draft_model"] if MODELS_DIR else None
+
+    if mode == "auto":
+        mode = "draft" if draft_path is not None and draft_path.exists() else "off"
+
+    if mode == "lookup":
+        return LlamaPromptLookupDecoding(num_pred_tokens=config["num_pred_tokens"] or LOOKUP_PRED_TOKENS), mode
+
+    if mode == "draft":
+        if draft_path is None or not draft_path.exists():
+            print(f"Draft model {config['draft_model']} not found, using plain decoding.")
+            return None, "off"
+        try:
+            print(f"Loading draft model from {draft_path}...")
+            draft_llm = create_llama(draft_path, {k: settings[k] for k in SHARED_SETTINGS if k in settings})
+        except Exception as e:
+            print(f"Draft model failed to load ({e}), using plain decoding.")
+            return None, "off"
+        return GGUFDraftModel(draft_llm, config["num_pred_tokens"] or DRAFT_PRED_TOKENS), mode
+
+    return None, "off"
+
+
+def check_draft(llm, draft):
+    # A draft with another vocabulary would only propose garbage token ids
+    if isinstance(draft, GGUFDraftModel) and draft.llm.n_vocab() != llm.n_vocab():
+        print("Draft model uses a different tokenizer than the main model, using plain decoding.")
+        llm.draft_model = None
+        # Free the draft's weights and KV cache now rather than keeping a second model around unused
+        close = getattr(draft.llm, "close", None) # older llama-cpp-python only frees it on collection
+        if close is not None:
+            close()
+        draft.llm = None
+        gc.collect()
+        return False
+    return True
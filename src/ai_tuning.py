@@ -0,0 +1,292 @@
+# Picks the llama.cpp runtime settings (threads, batch size, context size, mmap/mlock) for this machine.
+# On the first load the engine tries a few settings on the real model and keeps the fastest one in
+# cache/llm_runtime.json; later loads reuse it as long as the hardware and the model file are the same.
+#
+# Anything in models/llm_config.json wins over the tuned values, e.g.
+#   {"n_threads": 6, "n_batch": 256}        fixed values, the rest is still tuned
+#   {"autotune": false, "n_threads": 4}     no benchmarking at all, defaults + these values
+#   {"speculative": "off"}                  see ai_speculative.py
+#
+# Run "python ai_tuning.py" from the src folder to tune again and print the measurements.
+
+import gc
+import json
+import os
+import platform
+import time
+from datetime import datetime
+
+from ai_engine import BASE_DIR, MODEL_PATH, MODELS_DIR, build_prompt, create_llama
+
+RUNTIME_PATH = BASE_DIR / "cache" / "llm_runtime.json"
+CONFIG_PATH = (MODELS_DIR or BASE_DIR / "models") / "llm_config.json"
+
+# What the engine used before tuning existed
+DEFAULT_SETTINGS = {"n_ctx": 2048, "n_batch": 512, "n_gpu_layers": -1}
+TUNABLE_KEYS = ("n_ctx", "n_batch", "n_threads", "n_threads_batch", "n_gpu_layers", "use_mmap", "use_mlock")
+# Not Llama() arguments, read by ai_speculative.py
+SPECULATIVE_KEYS = ("speculative", "draft_model", "num_pred_tokens")
+
+BATCH_CANDIDATES = (256, 512, 1024)
+CONTEXT_CANDIDATES = (2048, 4096)
+# A bigger context is kept when it is at most this much slower (more room for report data)
+CONTEXT_TOLERANCE = 0.03
+
+# A typical analysis: report-specific prompt tokens (the shared prefix is cached) and answer length
+TYPICAL_PROMPT_TOKENS = 250
+TYPICAL_ANSWER_TOKENS = 300
+GEN_TOKENS = 32
+
+# Representative prompt for the measurements
+SAMPLE_PROMPT = build_prompt(
+    "You are a support operations analyst. Look at the weekly ticket volume and point out unusual weeks.",
+    "Weekly created cases (last 12 weeks): 412, 398, 455, 430, 601, 587, 444, 420, 415, 433, 470, 468. "
+    "Top products: Analytics Suite 1840, Billing Portal 1322, Mobile App 1207, API Gateway 998, Data Sync 702. "
+    "Severity split: Sev1 4%, Sev2 18%, Sev3 51%, Sev4 27%. Median resolution 26.5 hours, p90 141 hours."
+)
+
+
+def physical_cores():
+    # Hyper-threads share execution units, llama.cpp rarely gains from them
+    try:
+        cores = set()
+        physical_id = None
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key == "physical id":
+                    physical_id = value.strip()
+                elif key == "core id":
+                    cores.add((physical_id, value.strip()))
+        if cores:
+            return len(cores)
+    except OSError:
+        pass
+    return os.cpu_count() or 1
+
+
+def usable_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def total_ram_gb():
+    try:
+        return round(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024 ** 3, 1)
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def gpu_offload_supported():
+    try:
+        import llama_cpp
+        return bool(llama_cpp.llama_supports_gpu_offload())
+    except Exception:
+        return False
+
+
+def hardware_fingerprint(model_path):
+    try:
+        import llama_cpp
+        llama_version = getattr(llama_cpp, "__version__", "unknown")
+    except ImportError:
+        llama_version = None
+    return {
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpus": usable_cpus(),
+        "physical_cores": physical_cores(),
+        "ram_gb": total_ram_gb(),
+        "gpu_offload": gpu_offload_supported(),
+        "llama_cpp": llama_version,
+        "model": model_path.name,
+        "model_size": model_path.stat().st_size,
+    }
+
+
+def thread_candidates():
+    physical = min(physical_cores(), usable_cpus())
+    logical = usable_cpus()
+    candidates = {physical, logical}
+    if physical > 2:
+        candidates.add(physical - 1) # one core left for the dashboard
+    if physical >= 8:
+        candidates.add(physical // 2)
+    return sorted(candidates)
+
+
+def load_config(path=CONFIG_PATH):
+    if not path.exists():
+        return {}
+    try:
+        config = json.loads(path.read_text())
+    except (OSError, ValueError) as e:
+        print(f"Ignoring {path.name}: {e}")
+        return {}
+    known = set(TUNABLE_KEYS) | set(SPECULATIVE_KEYS) | {"autotune"}
+    unknown = set(config) - known
+    if unknown:
+        print(f"Ignoring unknown keys in {path.name}: {', '.join(sorted(unknown))}")
+    return {k: v for k, v in config.items() if k in known}
+
+
+def load_runtime(path=RUNTIME_PATH):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def save_runtime(fingerprint, settings, results, path=RUNTIME_PATH):
+    entry = {
+        "tuned_at": datetime.now().isoformat(timespec="seconds"),
+        "fingerprint": fingerprint,
+        "settings": settings,
+        "results": results,
+    }
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(entry, indent=2))
+    except OSError as e:
+        print(f"Could not save the tuned AI settings: {e}")
+
+
+def resolve_settings(model_path=MODEL_PATH, retune=False):
+    """Settings to create the Llama with: user config > tuned values for this machine > defaults."""
+    config = load_config()
+    overrides = {k: v for k, v in config.items() if k in TUNABLE_KEYS}
+    if not config.get("autotune", True):
+        return {**DEFAULT_SETTINGS, **overrides}
+
+    fingerprint = hardware_fingerprint(model_path)
+    saved = load_runtime()
+    if not retune and saved and saved.get("fingerprint") == fingerprint:
+        settings = saved["settings"]
+    else:
+        settings, results = autotune(model_path, fixed=overrides)
+        save_runtime(fingerprint, settings, results)
+    return {**settings, **overrides}
+
+
+def measure(model_path, settings):
+    """Loads the model with these settings and times prompt evaluation and generation (seconds per token)."""
+    start = time.perf_counter()
+    llm = create_llama(model_path, settings)
+    load_s = time.perf_counter() - start
+    try:
+        tokens = llm.tokenize(SAMPLE_PROMPT.encode("utf-8"), add_bos=True, special=True)
+
+        llm.reset()
+        start = time.perf_counter()
+        llm.eval(tokens)
+        prompt_s = time.perf_counter() - start
+
+        # Prompt is already in the context, generate() only evaluates the new tokens
+        generated = 0
+        start = time.perf_counter()
+        for _ in llm.generate(tokens, temp=0.0):
+            generated += 1
+            if generated >= GEN_TOKENS:
+                break
+        gen_s = time.perf_counter() - start
+    finally:
+        del llm
+        gc.collect()
+
+    result = {
+        "settings": settings,
+        "load_s": round(load_s, 3),
+        "prompt_s_per_token": prompt_s / len(tokens),
+        "gen_s_per_token": gen_s / max(generated, 1),
+    }
+    result["score_s"] = round(score(result), 3)
+    print(f"  {settings} -> prompt {len(tokens) / prompt_s:.1f} tok/s, generation {1 / result['gen_s_per_token']:.1f} tok/s")
+    return result
+
+
+def score(result):
+    # Estimated seconds for one typical analysis
+    return result["prompt_s_per_token"] * TYPICAL_PROMPT_TOKENS + result["gen_s_per_token"] * TYPICAL_ANSWER_TOKENS
+
+
+def autotune(model_path, fixed=None):
+    """
+    Coordinate search, one knob at a time (every measurement reloads the model, a full grid would take ages):
+    thread count, then batch size, then context size, then mmap/mlock. Values in fixed are not touched.
+    Returns (settings, measurements).
+    """
+    fixed = fixed or {}
+    print("Tuning the AI engine for this machine (first run only)...")
+    results = []
+
+    seen = {}
+
+    def run(settings):
+        settings = {**settings, **fixed}
+        key = json.dumps(settings, sort_keys=True)
+        if key not in seen: # the current best shows up again in the next sweep
+            try:
+                seen[key] = measure(model_path, settings)
+                results.append(seen[key])
+            except Exception as e:
+                print(f"  {settings} failed: {e}")
+                seen[key] = None
+        return seen[key]
+
+    best = dict(DEFAULT_SETTINGS)
+    if not gpu_offload_supported():
+        best["n_gpu_layers"] = 0
+
+    # Threads: generation and prompt evaluation scale differently, so each gets the count that suits it
+    if "n_threads" not in fixed or "n_threads_batch" not in fixed:
+        by_threads = {}
+        for threads in thread_candidates():
+            result = run({**best, "n_threads": threads, "n_threads_batch": threads})
+            if result:
+                by_threads[threads] = result
+        if by_threads:
+            best["n_threads"] = min(by_threads, key=lambda t: by_threads[t]["gen_s_per_token"])
+            best["n_threads_batch"] = min(by_threads, key=lambda t: by_threads[t]["prompt_s_per_token"])
+
+    # Batch size only changes prompt evaluation
+    if "n_batch" not in fixed:
+        by_batch = {}
+        for n_batch in BATCH_CANDIDATES:
+            result = run({**best, "n_batch": n_batch})
+            if result:
+                by_batch[n_batch] = result
+        if by_batch:
+            best["n_batch"] = min(by_batch, key=lambda b: by_batch[b]["prompt_s_per_token"])
+
+    # Context: the largest one that costs (almost) nothing
+    if "n_ctx" not in fixed:
+        by_ctx = {}
+        for n_ctx in CONTEXT_CANDIDATES:
+            result = run({**best, "n_ctx": n_ctx})
+            if result:
+                by_ctx[n_ctx] = result
+        if by_ctx:
+            fastest = min(r["score_s"] for r in by_ctx.values())
+            best["n_ctx"] = max(c for c, r in by_ctx.items() if r["score_s"] <= fastest * (1 + CONTEXT_TOLERANCE))
+
+    # Memory mapping: mlock fails without the permission (ulimit -l), such candidates are just skipped
+    if "use_mmap" not in fixed and "use_mlock" not in fixed:
+        by_memory = {}
+        for memory in ({"use_mmap": True, "use_mlock": False}, {"use_mmap": False, "use_mlock": False}, {"use_mmap": True, "use_mlock": True}):
+            result = run({**best, **memory})
+            if result:
+                by_memory[json.dumps(memory)] = (memory, result)
+        if by_memory:
+            memory, _ = min(by_memory.values(), key=lambda item: (item[1]["score_s"], item[1]["load_s"]))
+            best.update(memory)
+
+    print(f"AI engine settings for this machine: {best}")
+    return best, results
+
+
+if __name__ == "__main__":
+    if MODEL_PATH is None or not MODEL_PATH.exists():
+        raise SystemExit("Model file not found, see README.")
+    print(resolve_settings(MODEL_PATH, retune=True))
@@ -0,0 +1,106 @@
+# Inference process. Owns the LlamaEngine and answers requests one at a time, so tokenization and
+# generation never compete with Tk for the GIL and a crash only takes this process down.
+#
+# Parent -> worker (multiprocessing Queue):
+#   ("request", request_id, priority, payload, params, timeout_s)   lower priority value = served first
+#       payload: {"system", "context", "tables"}, packed into the context window here (prompt_builder.py)
+#   ("cancel", request_id)
+#   ("stop",)
+# Worker -> parent (Pipe):
+#   ("engine", info)                       info: {"n_ctx"}, sent before the "ready" state
+#   ("state", state, error)
+#   ("start", request_id)
+#   ("token", request_id, text)
+#   ("done", request_id, stats, reason)    reason: "complete" / "cancelled" / "timeout" / "error"
+
+import itertools
+import queue
+import threading
+import time
+
+from ai_engine import LlamaEngine
+
+STATE_LOADING = "loading"
+STATE_READY = "ready"
+STATE_FAILED = "failed"
+
+STOP_PRIORITY = -1
+
+
+def serve(requests, results):
+    """Process entry point (see AIAnalyst.load_async)."""
+    pending = queue.PriorityQueue()
+    cancelled = set()
+    lock = threading.Lock()
+    order = itertools.count() # FIFO among equal priorities
+
+    def read_requests():
+        # Cancels must get through while the main thread is busy generating
+        while True:
+            try:
+                message = requests.get()
+            except (EOFError, OSError):
+                message = ("stop",)
+            kind = message[0]
+            if kind == "request":
+                _, request_id, priority, payload, params, timeout_s = message
+                pending.put((priority, next(order), request_id, payload, params, timeout_s))
+            elif kind == "cancel":
+                with lock:
+                    cancelled.add(message[1])
+            else:
+                pending.put((STOP_PRIORITY, next(order), None, None, None, None))
+                return
+
+    threading.Thread(target=read_requests, daemon=True).start()
+
+    results.send(("state", STATE_LOADING, None))
+    engine = LlamaEngine()
+    if not engine.load():
+        results.send(("state", STATE_FAILED, engine.error))
+        return
+    results.send(("engine", {"n_ctx": engine.llm.n_ctx()}))
+    results.send(("state", STATE_READY, None))
+
+    while True:
+        _, _, request_id, payload, params, timeout_s = pending.get()
+        if request_id is None:
+            return
+
+        with lock:
+            skip = request_id in cancelled
+        if skip:
+            results.send(("done", request_id, {}, "cancelled"))
+            continue
+
+        results.send(("start", request_id))
+        deadline = time.monotonic() + timeout_s if timeout_s else None
+        stats = {}
+        reason = "complete"
+        try:
+            pack_start = time.perf_counter()
+            prompt, params, packing = engine.pack(payload, params)
+            stats.update(packing, max_tokens=params["max_tokens"], pack_s=time.perf_counter() - pack_start)
+            stream = engine.generate(prompt, stats, params)
+            try:
+                for text in stream:
+                    results.send(("token", request_id, text))
+                    # Checked after every token
+                    with lock:
+                        stop = request_id in cancelled
+                    if stop:
+                        reason = "cancelled"
+                        break
+                    if deadline is not None and time.monotonic() > deadline:
+                        reason = "timeout"
+                        break
+            finally:
+                stream.close()
+        except Exception as e:
+            # Only this request fails (e.g. a payload the tokenizer chokes on), the loaded model keeps serving the rest
+            print(f"AI worker: request {request_id} failed: {e}")
+            results.send(("token", request_id, f"Generation Error: {e}"))
+            stats, reason = {}, "error"
+        with lock:
+            cancelled.discard(request_id)
+        results.send(("done", request_id, stats, reason))
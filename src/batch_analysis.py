@@ -0,0 +1,105 @@
+# "Analyse all reports": runs the AI over every report in one go and builds a single document.
+# Report data is computed without drawing anything (GraphLibrary.compute), on a small pool so the
+# next report's numbers are ready while the model is still writing about the current one.
+# The model stays loaded the whole time and every prompt shares the cached prefix (see ai_engine.py),
+# answers already in the response cache come back instantly.
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_analyst import PRIORITY_BATCH
+from graphs import ReportCancelled
+
+
+class BatchAnalysis:
+    def __init__(self, graph_lib, analyst, reports, workers=2):
+        """
+        reports: dict display name -> report key (same as AnalyticsApp.reports).
+        """
+        self.graph_lib = graph_lib
+        self.analyst = analyst
+        self.reports = reports
+        self.workers = workers
+
+        self.sections = []  # (name, text) in report order, filled while running
+        self.timings = {}
+        self.cancelled = False
+
+    def run(self, cancel=None, progress=None):
+        """
+        Generator yielding the consolidated report (markdown) piece by piece.
+        progress(done, total, name) is called before each report starts (and once at the end).
+        Setting the cancel Event stops after the current token.
+        """
+        names = list(self.reports)
+        total = len(names)
+        start = time.perf_counter()
+        self.sections = []
+        self.timings = {}
+        self.cancelled = False
+
+        yield "# AI analysis of all reports\n\n"
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="batch") as executor:
+            futures = [executor.submit(self.graph_lib.compute, self.reports[name], cancel) for name in names]
+
+            for i, (name, future) in enumerate(zip(names, futures)):
+                if cancel is not None and cancel.is_set():
+                    break
+                if progress:
+                    progress(i, total, name)
+
+                yield f"## {name}\n\n"
+                try:
+                    data = future.result()
+                except ReportCancelled:
+                    break
+                except Exception as e:
+                    text = f"Could not compute this report: {e}"
+                    self.sections.append((name, text))
+                    yield text + "\n\n"
+                    continue
+
+                report_start = time.perf_counter()
+                pieces = []
+                # Low priority: a click on the normal AI button is served in between
+                stream = self.analyst.analyze_stream(data['system_prompt'], data['data_context'], priority=PRIORITY_BATCH,
+                                                     tables=data.get('tables'))
+                try:
+                    for piece in stream:
+                        if cancel is not None and cancel.is_set():
+                            break
+                        pieces.append(piece)
+                        yield piece
+                finally:
+                    stream.close() # cancels the request in the worker right away
+
+                self.timings[name] = time.perf_counter() - report_start
+                self.sections.append((name, "".join(pieces).strip()))
+                yield "\n\n"
+
+            for future in futures:
+                future.cancel()
+
+        self.cancelled = cancel is not None and cancel.is_set()
+        elapsed = time.perf_counter() - start
+        if self.cancelled:
+            yield f"_Cancelled after {len(self.sections)} of {total} reports ({elapsed:.1f}s)._\n"
+        else:
+            yield f"_{total} reports analysed in {elapsed:.1f}s._\n"
+        if progress:
+            progress(len(self.sections), total, None)
+
+    def to_markdown(self):
+        parts = ["# AI analysis of all reports\n"]
+        for name, text in self.sections:
+            parts.append(f"## {name}\n\n{text}\n")
+        return "\n".join(parts)
+
+    def save(self, path):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(self.to_markdown(), encoding="utf-8")
+            print(f"Batch AI report saved to {path}")
+        except OSError as e:
+            print(f"Could not save batch AI report: {e}")
@@ -0,0 +1,133 @@
+# Measures prompt evaluation time of the AI analysis for every report.
+# Runs each report's real prompt (tables packed into the context like the worker does) twice: once evaluated from scratch (how every analysis used to run)
+# and once with the shared PROMPT_PREFIX kept in llama.cpp's KV cache.
+# Only one token is generated per run, so time to first token ~= prompt evaluation.
+#
+# "speculative" compares generation speed with each speculative decoding mode (ai_speculative.py)
+# against plain decoding, at the dashboard's temperature with a fixed seed, and how close the answers are.
+#
+# Usage (from the src folder, needs the model and the data file):
+#   python bench_ai.py [rounds]
+#   python bench_ai.py speculative [max_tokens]
+
+import difflib
+import gc
+import statistics
+import sys
+
+import matplotlib
+matplotlib.use("Agg")
+
+from ai_engine import GENERATION_PARAMS, LlamaEngine, build_prompt
+from data_manager import DataManager
+from graphs import GraphLibrary, REPORT_KEYS
+
+
+def load_prompts():
+    dm = DataManager(persistent=True)
+    if not dm.load_data():
+        sys.exit("Could not load the support cases data.")
+    graphs = GraphLibrary(dm)
+    prompts = []
+    for key in REPORT_KEYS:
+        data = graphs.compute(key)
+        prompts.append((key, {"system": data['system_prompt'], "context": data['data_context'], "tables": data.get('tables', [])}))
+    return prompts
+
+
+def run(engine, prompts, rounds):
+    # Prompt eval only: a single token per run
+    params = dict(engine.generation_params, max_tokens=1)
+    times = {key: [] for key, _ in prompts}
+    for _ in range(rounds):
+        for key, prompt in prompts:
+            stats = {}
+            "".join(engine.generate(prompt, stats, params))
+            times[key].append(stats["ttft_s"])
+    return {key: statistics.median(t) for key, t in times.items()}
+
+
+SEED = 1234
+
+
+def run_speculative(mode, payloads, max_tokens):
+    engine = LlamaEngine(speculative=mode)
+    if not engine.load():
+        sys.exit(engine.error)
+    if engine.speculative != mode:
+        print(f"Skipping {mode}: not available ({engine.speculative} instead).")
+        return None
+
+    params = dict(engine.generation_params, max_tokens=max_tokens, seed=SEED)
+    results = {}
+    for key, payload in payloads:
+        prompt, _, _ = engine.pack(payload, params)
+        stats = {}
+        text = "".join(engine.generate(prompt, stats, params))
+        results[key] = (text, stats["tokens_per_s"] or 0.0)
+
+    # One model in memory at a time
+    del engine
+    gc.collect()
+    return results
+
+
+def main_speculative(max_tokens):
+    payloads = load_prompts()
+    results = {}
+    for mode in ("off", "lookup", "draft"):
+        print(f"\n--- speculative decoding: {mode} ---")
+        result = run_speculative(mode, payloads, max_tokens)
+        if result is not None:
+            results[mode] = result
+
+    # Same seed, but speculation changes how often the sampler draws, so at temperature > 0 the
+    # answers can differ a bit even though both come from the main model's distribution
+    plain = results["off"]
+    print(f"\nGeneration speed, up to {max_tokens} tokens per report (temperature {GENERATION_PARAMS['temperature']}, seed {SEED})")
+    print(f"{'mode':<10}{'tok/s':>8}{'speedup':>9}{'identical':>11}{'similarity':>12}")
+    base_speed = statistics.mean(speed for _, speed in plain.values())
+    for mode, result in results.items():
+        speed = statistics.mean(s for _, s in result.values())
+        identical = sum(result[key][0] == plain[key][0] for key in plain)
+        similarity = statistics.mean(difflib.SequenceMatcher(None, result[key][0], plain[key][0]).ratio() for key in plain)
+        print(f"{mode:<10}{speed:>8.1f}{speed / base_speed if base_speed else 0:>8.2f}x{identical:>6}/{len(plain):<4}{similarity:>12.0%}")
+
+    best = max(results, key=lambda m: statistics.mean(s for _, s in results[m].values()))
+    print(f'\nFastest here: "{best}" -> models/llm_config.json {{"speculative": "{best}"}}')
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "speculative":
+        return main_speculative(int(sys.argv[2]) if len(sys.argv) > 2 else 200)
+
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    payloads = load_prompts()
+
+    # In-process engine, the numbers are about llama.cpp itself (no worker process or response cache)
+    engine = LlamaEngine()
+    if not engine.load():
+        sys.exit(engine.error)
+
+    prefix_tokens = len(engine.prompt_tokens(build_prompt("", "")))
+    prompts = [(key, engine.pack(payload)[0]) for key, payload in payloads]
+
+    engine.reuse_prefix = False
+    scratch = run(engine, prompts, rounds)
+    engine.reuse_prefix = True
+    reused = run(engine, prompts, rounds)
+
+    print(f"\nPrompt evaluation, median of {rounds} runs (shared prefix ~{prefix_tokens} tokens)")
+    print(f"{'report':<20}{'tokens':>8}{'scratch s':>12}{'prefix s':>12}{'saved':>8}")
+    for key, prompt in prompts:
+        n = len(engine.prompt_tokens(prompt))
+        saved = 1 - reused[key] / scratch[key] if scratch[key] else 0.0
+        print(f"{key:<20}{n:>8}{scratch[key]:>12.3f}{reused[key]:>12.3f}{saved:>8.0%}")
+
+    total_scratch = sum(scratch.values())
+    total_reused = sum(reused.values())
+    print(f"{'total':<20}{'':>8}{total_scratch:>12.3f}{total_reused:>12.3f}{1 - total_reused / total_scratch:>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
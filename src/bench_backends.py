@@ -0,0 +1,163 @@
+# Checks and times the query backends of DataManager (query_backend.py) against each other.
+#
+#   parity - computes all nine reports on every installed backend over the same database and checks
+#            that everything they return (tables, AI context text, numbers) is identical to SQLite.
+#            Exits with status 1 on any difference.
+#            tests/test_backend_parity.py runs the same comparison under pytest.
+#   speed  - on synthetic data (synthetic_data.py): the nine reports (query cache off) and a few scans over
+#            the raw cases / accounts tables (SCAN_QUERIES) per backend. "first run" is one pass
+#            over all of them right after loading (DuckDB copies the tables it reads then), the other rows
+#            are the median of several rounds afterwards.
+#
+# Usage (from the src folder):
+#   python bench_backends.py parity [--data-dir DIR]
+#   python bench_backends.py speed [--sizes 100k,1m] [--rounds 5]
+
+import argparse
+import statistics
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import query_backend
+from data_manager import DataManager
+from graphs import GraphLibrary, REPORT_KEYS
+
+# Full scans over the raw tables, the shapes the reports ran before they read the agg_* tables
+SCAN_QUERIES = {
+    "product group": "SELECT case_product_code, COUNT(*) FROM cases GROUP BY case_product_code",
+    "country join": """SELECT a.account_country_code, COUNT(c.case_id) FROM cases c
+                       JOIN accounts a ON c.account_id = a.account_id GROUP BY a.account_country_code""",
+    "weekly volume": "SELECT case_created_week, COUNT(*) FROM cases GROUP BY case_created_week",
+    "daily closed": "SELECT case_closed_day, COUNT(*) FROM cases WHERE case_closed_day IS NOT NULL GROUP BY case_closed_day",
+    "resolution": """SELECT (case_closed_ts - case_created_ts) / 86400.0 FROM cases
+                     WHERE case_status_code = (SELECT code FROM lookup_case_status WHERE value = 'Closed')
+                       AND case_closed_ts IS NOT NULL""",
+}
+
+
+def installed_backends():
+    return [name for name in query_backend.BACKENDS if query_backend.available(name)]
+
+
+def load(backend, data_dir=None, cache_path=None):
+    dm = DataManager(persistent=True, cache_path=cache_path, data_dir=data_dir, query_cache_bytes=0, backend=backend)
+    if not dm.load_data():
+        sys.exit("Could not load the support cases data.")
+    return dm
+
+
+# --- PARITY ---
+
+def differences(expected, actual, path=""):
+    """Human readable list of where two compute() results differ (empty = identical)."""
+    if isinstance(expected, pd.DataFrame) or isinstance(expected, pd.Series):
+        try:
+            if isinstance(expected, pd.DataFrame):
+                pd.testing.assert_frame_equal(expected, actual, check_exact=True)
+            else:
+                pd.testing.assert_series_equal(expected, actual, check_exact=True)
+        except AssertionError as e:
+            return [f"{path}: {' '.join(str(e).split())[:300]}"]
+        return []
+    if isinstance(expected, pd.Index):
+        same = isinstance(actual, pd.Index) and expected.dtype == actual.dtype and expected.equals(actual)
+        return [] if same else [f"{path}: index differs"]
+    if isinstance(expected, np.ndarray):
+        same = isinstance(actual, np.ndarray) and expected.dtype == actual.dtype and np.array_equal(expected, actual, equal_nan=expected.dtype.kind == "f")
+        return [] if same else [f"{path}: arrays differ"]
+    if isinstance(expected, dict):
+        if not isinstance(actual, dict) or set(expected) != set(actual):
+            return [f"{path}: keys differ"]
+        return [d for k in expected for d in differences(expected[k], actual[k], f"{path}.{k}")]
+    if isinstance(expected, (list, tuple)):
+        if type(expected) is not type(actual) or len(expected) != len(actual):
+            return [f"{path}: length differs"]
+        return [d for i, (e, a) in enumerate(zip(expected, actual)) for d in differences(e, a, f"{path}[{i}]")]
+    if type(expected) is not type(actual) or not (expected == actual or (expected != expected and actual != actual)):
+        return [f"{path}: {expected!r} != {actual!r}"]
+    return []
+
+
+def main_parity(args):
+    backends = installed_backends()
+    if len(backends) < 2:
+        print(f"Only {', '.join(backends)} is installed, nothing to compare (pip install duckdb).")
+        return 0
+
+    results = {}
+    for backend in backends:
+        dm = load(backend, args.data_dir)
+        graphs = GraphLibrary(dm)
+        results[backend] = {key: graphs.compute(key) for key in REPORT_KEYS}
+        dm.backend.close()
+
+    failed = 0
+    reference = results["sqlite"]
+    for backend in backends[1:]:
+        for key in REPORT_KEYS:
+            found = differences(reference[key], results[backend][key], key)
+            print(f"  {backend:<8}{key:<22}{'identical' if not found else 'DIFFERENT'}")
+            for line in found[:5]:
+                print(f"      {line}")
+            failed += bool(found)
+    print("All reports identical." if not failed else f"{failed} report(s) differ.")
+    return 1 if failed else 0
+
+
+# --- SPEED ---
+
+def timed(function, rounds):
+    times = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def main_speed(args):
+    from bench_suite import parse_size, prepare_data
+
+    backends = installed_backends()
+    for n_cases in (parse_size(s) for s in args.sizes.split(",") if s.strip()):
+        data_dir, _ = prepare_data(n_cases, args.seed)
+        cache_path = data_dir / "backends.sqlite"
+        load("sqlite", data_dir, cache_path) # builds the cache once, every backend opens the same file
+
+        print(f"\n=== {n_cases} cases ===")
+        rows = {}
+        for backend in backends:
+            dm = load(backend, data_dir, cache_path)
+            graphs = GraphLibrary(dm)
+            run_all = lambda: ([graphs.compute(key) for key in REPORT_KEYS], [dm.get_query(sql) for sql in SCAN_QUERIES.values()])
+            first = timed(run_all, 1)
+            reports = timed(lambda: [graphs.compute(key) for key in REPORT_KEYS], args.rounds)
+            scans = {name: timed(lambda: dm.get_query(sql), args.rounds) for name, sql in SCAN_QUERIES.items()}
+            rows[backend] = {"first run": first, "9 reports": reports, **scans}
+            dm.backend.close()
+
+        print(f"{'':<22}" + "".join(f"{b:>12}" for b in backends) + ("     speed-up" if len(backends) > 1 else ""))
+        for name in rows[backends[0]]:
+            times = [rows[b][name] for b in backends]
+            speedup = f"{times[0] / times[-1]:>12.1f}x" if len(backends) > 1 and times[-1] else ""
+            print(f"{name:<22}" + "".join(f"{t * 1000:>10.1f}ms" for t in times) + speedup)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parity check and benchmark of the query backends.")
+    parser.add_argument("mode", choices=("parity", "speed"))
+    parser.add_argument("--data-dir", default=None, help="parity: folder with the JSON files (default: the usual data/ folder)")
+    parser.add_argument("--sizes", default="100k,1m", help="speed: comma separated case counts (default: 100k,1m)")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.mode == "parity":
+        sys.exit(main_parity(args))
+    main_speed(args)
+
+
+if __name__ == "__main__":
+    main()
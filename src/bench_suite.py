@@ -0,0 +1,243 @@
+# Scaling benchmark for the data side of the dashboard, on synthetic data (synthetic_data.py).
+# For every size it times:
+#   ingest  - load_data() building the SQLite cache from the JSON files (cold)
+#   attach  - load_data() reusing that cache (what every later launch does)
+#   report  - per report: compute (SQL + pandas), render (Matplotlib, Agg, drawn to PNG) and
+#             AI prompt construction (tables packed into the context by prompt_builder.py)
+# Every stage runs in its own fresh process, so wall time and peak memory (max RSS) are per stage.
+# Results go to a JSON file that can be compared with the one from another commit.
+#
+# Usage (from the src folder):
+#   python bench_suite.py [--sizes 10k,100k,1m,10m] [--seed 0] [--out results.json]
+#   python bench_suite.py --compare old.json new.json
+#
+# Generated data and databases are kept in cache/bench/ and reused while size and seed are the same.
+
+import argparse
+import io
+import json
+import multiprocessing
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+BENCH_DIR = BASE_DIR / "cache" / "bench"
+DEFAULT_SIZES = "10k,100k"
+
+# Prompt construction without the model: ~4 characters per token, a typical tuned context
+CHARS_PER_TOKEN = 4
+PROMPT_N_CTX = 4096
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1], 1)
+    return int(float(text.rstrip("km")) * scale)
+
+
+def peak_rss_mb():
+    # Linux: high-water mark of this process only (ru_maxrss also counts the parent it was forked from)
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# --- STAGES (each one runs in a fresh process) ---
+
+def stage_ingest(data_dir, cache_path):
+    from data_manager import DataManager
+
+    start = time.perf_counter()
+    dm = DataManager(cache_path=cache_path, data_dir=data_dir)
+    if not dm.load_data():
+        raise RuntimeError("load_data failed")
+    return {"wall_s": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb(),
+            "db_mb": round(Path(cache_path).stat().st_size / 1024 ** 2, 1), "bytes_per_case": dm.memory_stats}
+
+
+def stage_attach(data_dir, cache_path):
+    from data_manager import DataManager
+
+    start = time.perf_counter()
+    dm = DataManager(cache_path=cache_path, data_dir=data_dir)
+    if not dm.load_data():
+        raise RuntimeError("load_data failed")
+    return {"wall_s": time.perf_counter() - start, "peak_rss_mb": peak_rss_mb()}
+
+
+def stage_report(data_dir, cache_path, key):
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    from ai_engine import build_prompt
+    from data_manager import DataManager
+    from export_charts import DPI, FIGSIZE
+    from graphs import GraphLibrary
+    from prompt_builder import PromptBuilder
+
+    dm = DataManager(cache_path=cache_path, data_dir=data_dir)
+    if not dm.load_data():
+        raise RuntimeError("load_data failed")
+    graphs = GraphLibrary(dm)
+    baseline_mb = peak_rss_mb()
+
+    start = time.perf_counter()
+    data = graphs.compute(key)
+    compute_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fig, ax = plt.subplots(figsize=FIGSIZE, dpi=DPI)
+    graphs.render(key, ax, data)
+    fig.tight_layout()
+    fig.savefig(io.BytesIO(), format="png")
+    plt.close(fig)
+    render_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    builder = PromptBuilder(lambda text: len(text) // CHARS_PER_TOKEN + 1, PROMPT_N_CTX, build_prompt)
+    _, _, info = builder.build(data['system_prompt'], data['data_context'], data.get('tables'))
+    prompt_s = time.perf_counter() - start
+
+    return {
+        "compute_s": compute_s,
+        "render_s": render_s,
+        "prompt_s": prompt_s,
+        "wall_s": compute_s + render_s + prompt_s,
+        "prompt_rows": info["rows_packed"],
+        "rows_total": info["rows_total"],
+        "peak_rss_mb": peak_rss_mb(),
+        "attached_rss_mb": baseline_mb,
+    }
+
+
+def run_stage(function, *args):
+    # New process per stage: max RSS can't be reset inside a process
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+        return pool.submit(function, *args).result()
+
+
+def prepare_data(n_cases, seed):
+    from synthetic_data import CASES_FILENAME, generate
+
+    data_dir = BENCH_DIR / f"{n_cases}_seed{seed}"
+    if not (data_dir / CASES_FILENAME).exists():
+        start = time.perf_counter()
+        generate(data_dir, n_cases, seed=seed)
+        return data_dir, time.perf_counter() - start
+    return data_dir, None
+
+
+def run(sizes, seed):
+    from graphs import REPORT_KEYS
+
+    results = []
+    for n_cases in sizes:
+        print(f"\n=== {n_cases} cases ===")
+        data_dir, generate_s = prepare_data(n_cases, seed)
+        if generate_s is not None:
+            results.append({"size": n_cases, "stage": "generate", "wall_s": generate_s})
+
+        cache_path = data_dir / "bench.sqlite"
+        if cache_path.exists():
+            cache_path.unlink()
+
+        for stage, function in (("ingest", stage_ingest), ("attach", stage_attach)):
+            result = run_stage(function, str(data_dir), str(cache_path))
+            results.append({"size": n_cases, "stage": stage, **result})
+            print(f"  {stage:<28}{result['wall_s']:>9.3f}s  peak {result['peak_rss_mb']} MB")
+
+        for key in REPORT_KEYS:
+            result = run_stage(stage_report, str(data_dir), str(cache_path), key)
+            results.append({"size": n_cases, "stage": "report", "report": key, **result})
+            print(f"  {key:<28}{result['wall_s']:>9.3f}s  (compute {result['compute_s']:.3f}, render {result['render_s']:.3f}, "
+                  f"prompt {result['prompt_s']:.3f})  peak {result['peak_rss_mb']} MB")
+    return results
+
+
+# --- COMPARISON ---
+
+def result_key(result):
+    return result["size"], result["stage"], result.get("report", "")
+
+
+def compare(old_path, new_path):
+    old = json.loads(Path(old_path).read_text())
+    new = json.loads(Path(new_path).read_text())
+    old_results = {result_key(r): r for r in old["results"]}
+    print(f"{old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    print(f"{'size':>10}  {'stage':<28}{'old s':>9}{'new s':>9}{'change':>9}{'old MB':>9}{'new MB':>9}")
+    for result in new["results"]:
+        before = old_results.get(result_key(result))
+        if before is None or result["stage"] == "generate":
+            continue
+        change = result["wall_s"] / before["wall_s"] - 1 if before["wall_s"] else 0.0
+        name = result.get("report") or result["stage"]
+        print(f"{result['size']:>10}  {name:<28}{before['wall_s']:>9.3f}{result['wall_s']:>9.3f}{change:>+9.0%}"
+              f"{before.get('peak_rss_mb') or 0:>9}{result.get('peak_rss_mb') or 0:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time ingestion, reports and prompt construction on synthetic data.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help=f"comma separated case counts (default: {DEFAULT_SIZES})")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="results file (default: cache/bench/results_<commit>_<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two results files and exit")
+    parser.add_argument("--clean", action="store_true", help="delete the generated data in cache/bench/ first")
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare)
+    if args.clean and BENCH_DIR.exists():
+        shutil.rmtree(BENCH_DIR)
+
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    meta = {
+        "commit": git_commit(),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": multiprocessing.cpu_count(),
+        "seed": args.seed,
+        "sizes": sizes,
+    }
+    results = run(sizes, args.seed)
+
+    out = Path(args.out) if args.out else BENCH_DIR / f"results_{meta['commit'] or 'nogit'}_{datetime.now():%Y%m%d_%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({"meta": meta, "results": results}, indent=2))
+    print(f"\nResults saved to {out}")
+
+
+if __name__ == "__main__":
+    main()
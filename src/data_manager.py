@@ -1,15 +1,213 @@
+import numpy as np
 import pandas as pd
 import sqlite3
+import json
+import codecs
+import hashlib
+import os
+import time
+import threading
+from datetime import datetime, timezone
 from pathlib import Path
 
+import perf
+import snapshot
+from aggregates import AggregationEngine
+from query_backend import DEFAULT_BACKEND, SQLiteBackend, open_backend
+from query_cache import QueryCache, DEFAULT_MAX_BYTES, make_key
+
+# Files bigger than this are streamed into SQLite instead of going through pd.read_json.
+# pd.read_json + to_sql peaks at several times the file size, which kills 8-16GB laptops on big exports.
+STREAM_THRESHOLD_BYTES = 256 * 1024 * 1024
+STREAM_BATCH_ROWS = 20_000
+READ_CHUNK_BYTES = 1024 * 1024
+
+# Bump whenever the tables written by load_data change, so old cache files get rebuilt
+CACHE_SCHEMA_VERSION = 7
+CACHE_FILENAME = "analytics_cache.sqlite"
+
+DATE_COLUMNS = ("case_created_date", "case_closed_date", "account_created_date")
+
+# Declared types for the columns the reports use. Anything else found in the JSON is kept untyped.
+# Dates are stored as 'YYYY-MM-DD HH:MM:SS' text, which sorts and compares correctly as a string.
+TABLE_SCHEMAS = {
+    "cases": {
+        "case_sfid": "TEXT PRIMARY KEY",
+        "account_sfid": "TEXT",
+        "case_product": "TEXT",
+        "case_severity": "TEXT",
+        "case_type": "TEXT",
+        "case_status": "TEXT",
+        "case_created_date": "TEXT",
+        "case_closed_date": "TEXT",
+    },
+    "accounts": {
+        "account_sfid": "TEXT PRIMARY KEY",
+        "account_name": "TEXT",
+        "account_created_date": "TEXT",
+        "account_country": "TEXT",
+        "account_industry": "TEXT",
+    },
+}
+
+# Compact layout, applied right after the raw rows are in (_encode_keys):
+#   - the 64-character ids become integer surrogate keys (case_id, account_id; cases.account_sfid is
+#     replaced by account_id), so joins compare integers
+#   - low-cardinality text becomes <column>_code, with a lookup_<column> table (code -> value) each.
+#     Codes are 1..n in alphabetical order of the values, NULL stays NULL.
+SURROGATE_KEYS = {"cases": ("case_id", "case_sfid"), "accounts": ("account_id", "account_sfid")}
+CATEGORY_COLUMNS = {
+    "cases": ("case_product", "case_severity", "case_type", "case_status"),
+    "accounts": ("account_country", "account_industry"),
+}
+# Rows sampled for the bytes-per-row memory report
+MEMORY_SAMPLE_ROWS = 50_000
+
+# Integer copies of the case dates, computed once at load so the time reports
+# group and subtract integers instead of parsing date strings on every row:
+#   <prefix>_ts   -> unix epoch seconds
+#   <prefix>_day  -> days since 1970-01-01
+#   <prefix>_week -> ISO year * 100 + ISO week (e.g. 202403)
+EPOCH_DATE_COLUMNS = {
+    "case_created": "case_created_date",
+    "case_closed": "case_closed_date",
+}
+
+# No secondary indexes: the reports read the agg_* tables, and the only other reads of cases / accounts
+# are full scans (aggregates.py) and the key lookups of _encode_keys, served by the primary / unique keys.
+
+
+def iter_json_array(path, chunk_bytes=READ_CHUNK_BYTES):
+    """
+    Incrementally parses a file holding a single top-level JSON array.
+    Yields (record, bytes_read) one element at a time, so memory only depends on chunk_bytes.
+    Raises ValueError (with the byte offset) on anything that isn't exactly one well-formed array.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    bytes_read = 0
+    eof = False
+    # What may come next: "[" (start of file), "first" (a value or "]"), "value", "separator" ("," or "]"),
+    # "end" (only whitespace after the closing bracket)
+    expect = "["
+
+    def error(message):
+        # Bytes handed to the decoder, minus what is still unparsed (and a possibly half-decoded character)
+        offset = bytes_read - len(utf8.getstate()[0]) - len(buf[pos:].encode("utf-8"))
+        return ValueError(f"{path.name}: {message} at byte {offset}")
+
+    with open(path, "rb") as f:
+        while True:
+            whitespace = " \t\r\n\ufeff" if expect == "[" else " \t\r\n"
+            while pos < len(buf) and buf[pos] in whitespace:
+                pos += 1
+
+            if pos < len(buf):
+                char = buf[pos]
+                if expect == "[":
+                    if char != "[":
+                        raise error("expected a top-level JSON array")
+                    pos += 1
+                    expect = "first"
+                    continue
+                if expect == "end":
+                    raise error("unexpected data after the JSON array")
+                if char == "]" and expect in ("first", "separator"):
+                    pos += 1
+                    expect = "end"
+                    continue
+                if expect == "separator":
+                    if char != ",":
+                        raise error("expected ',' or ']' between elements")
+                    pos += 1
+                    expect = "value"
+                    continue
+                try:
+                    record, end = decoder.raw_decode(buf, pos)
+                    # A value ending exactly at the buffer edge may be cut in half (e.g. a number)
+                    if end < len(buf) or eof:
+                        pos = end
+                        expect = "separator"
+                        yield record, bytes_read
+                        continue
+                except json.JSONDecodeError as e:
+                    if eof:
+                        raise error(f"invalid JSON value ({e.msg})")
+
+            if eof:
+                if expect == "end":
+                    return
+                if expect == "[":
+                    raise ValueError(f"{path.name}: file is empty")
+                raise error("unterminated JSON array")
+
+            # Need more data: drop what was already consumed and read the next chunk
+            chunk = f.read(chunk_bytes)
+            bytes_read += len(chunk)
+            eof = not chunk
+            buf = buf[pos:] + utf8.decode(chunk, final=eof)
+            pos = 0
+
+
+def file_sha256(path, chunk_bytes=READ_CHUNK_BYTES):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_bytes):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def normalize_timestamp(value):
+    # Same text format pandas' to_sql writes for datetime columns ('YYYY-MM-DD HH:MM:SS')
+    if value is None or not isinstance(value, str):
+        return value
+    try:
+        ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return value
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts.isoformat(sep=" ")
+
+
+def connect(path):
+    # The connection is shared with background threads (prefetch, report workers)
+    return sqlite3.connect(path, check_same_thread=False)
+
+
 class DataManager:
-    def __init__(self):
-        self.conn = sqlite3.connect(':memory:')
+    def __init__(self, streaming=None, persistent=False, cache_path=None, query_cache_bytes=DEFAULT_MAX_BYTES, data_dir=None,
+                 backend=None):
+        self.conn = connect(':memory:')
+        # Reports are warmed/computed on worker threads, so reads on the shared connection are serialized
+        self.db_lock = threading.Lock()
+        self.cache_dir = None
+        # None = decide per file based on its size, True/False forces a mode
+        self.streaming = streaming
+        # Persistent mode keeps the built database on disk and reuses it while the JSON is unchanged
+        self.persistent = persistent or cache_path is not None
+        self.cache_path = Path(cache_path) if cache_path else None
+        # get_query results, dropped whenever the tables are reloaded. 0 disables it.
+        self.query_cache = QueryCache(query_cache_bytes) if query_cache_bytes else None
+        # Folder with the two JSON files, None = search the usual places (e.g. synthetic data for benchmarks)
+        self.data_dir = Path(data_dir) if data_dir else None
+        # Bytes per row before/after _encode_keys, filled when the tables are built (not when a cache is reused)
+        self.memory_stats = None
+        # Engine get_query runs on (query_backend.py): "sqlite" or "duckdb", None = ANALYTICS_BACKEND / sqlite
+        self.backend_name = backend or DEFAULT_BACKEND
+        self.backend = SQLiteBackend(self.conn)
 
-    def load_data(self):
+    def load_data(self, progress=None):
+        """
+        progress: optional callback(label, fraction) called while the tables are being filled.
+        """
         try:
             print("Initializing Data Manager...")
-            
+            if self.query_cache:
+                self.query_cache.clear()
+
             # Smart Path Search
             current_path = Path(__file__).resolve()
             search_paths = [
@@ -18,13 +216,15 @@ class DataManager:
                 current_path.parent.parent / "data", # ../data
                 Path.cwd() / "data"              # CWD/data
             ]
-            
+            if self.data_dir:
+                search_paths = [self.data_dir]
+
             data_dir = None
             for p in search_paths:
                 if (p / "support_cases_anonymized.json").exists():
                     data_dir = p
                     break
-            
+
             if not data_dir:
                 print("CRITICAL: Data files not found.")
                 print(f"Searched in: {[str(p) for p in search_paths]}")
@@ -33,21 +233,448 @@ class DataManager:
             cases_path = data_dir / "support_cases_anonymized.json"
             accounts_path = data_dir / "accounts_anonymized.json"
 
-            cases = pd.read_json(cases_path)
-            accounts = pd.read_json(accounts_path, convert_dates=["account_created_date"])
-            
-            cases['case_created_date'] = pd.to_datetime(cases['case_created_date'])
-            cases['case_closed_date'] = pd.to_datetime(cases['case_closed_date'])
+            if not self.persistent:
+                n_cases, n_accounts = self._ingest(cases_path, accounts_path, progress)
+                print(f"Database Loaded: {n_cases} cases, {n_accounts} accounts.")
+                self._open_backend()
+                return True
 
-            cases.to_sql('cases', self.conn, index=False, if_exists='replace')
-            accounts.to_sql('accounts', self.conn, index=False, if_exists='replace')
-            
-            print(f"Database Loaded: {len(cases)} cases, {len(accounts)} accounts.")
+            # Persistent cache: stored next to data/ so every launch can reuse it
+            cache_path = self.cache_path or data_dir.parent / "cache" / CACHE_FILENAME
+            self.cache_dir = cache_path.parent
+            sources = [cases_path, accounts_path]
+
+            counts = self._attach_cache(cache_path, sources)
+            if counts:
+                print(f"Database Loaded from cache: {counts[0]} cases, {counts[1]} accounts.")
+                self._open_backend()
+                return True
+
+            n_cases, n_accounts = self._build_cache(cache_path, sources, progress)
+            print(f"Database Loaded: {n_cases} cases, {n_accounts} accounts (cached at {cache_path}).")
+            self._open_backend()
             return True
-            
+
         except Exception as e:
             print(f"Data Load Error: {e}")
             return False
 
-    def get_query(self, sql_query):
-        return pd.read_sql(sql_query, self.conn)
\ No newline at end of file
+    @perf.traced("load.ingest")
+    def _ingest(self, cases_path, accounts_path, progress=None):
+        n_cases, n_accounts = self._load_json(cases_path, accounts_path, progress)
+        return self._finish_ingest(n_cases, n_accounts)
+
+    def _load_json(self, cases_path, accounts_path, progress=None):
+        # Raw rows into the cases / accounts tables, returns how many records the files had
+        if self._should_stream(cases_path, accounts_path):
+            n_cases = self._stream_table(cases_path, 'cases', progress)
+            n_accounts = self._stream_table(accounts_path, 'accounts', progress)
+        else:
+            with perf.span("load.json_parse"):
+                if progress:
+                    progress("Reading JSON files", 0.0)
+                cases = pd.read_json(cases_path)
+                if progress:
+                    progress("Reading JSON files", 0.5)
+                accounts = pd.read_json(accounts_path, convert_dates=["account_created_date"])
+
+                cases['case_created_date'] = pd.to_datetime(cases['case_created_date'])
+                cases['case_closed_date'] = pd.to_datetime(cases['case_closed_date'])
+
+            with perf.span("load.to_sql", rows=len(cases) + len(accounts)):
+                n_cases = self._insert_frame('cases', cases, progress)
+                n_accounts = self._insert_frame('accounts', accounts, progress)
+        return n_cases, n_accounts
+
+    @perf.traced("load.snapshot_read")
+    def _load_snapshot(self, snap, progress=None):
+        # Same raw tables as _load_json, from the memory-mapped Arrow files instead of the JSON
+        counts = []
+        for table in ("cases", "accounts"):
+            print(f"Loading '{table}' from the data snapshot...")
+            total = max(snap.open(table).num_rows, 1)
+            rows = 0
+            for df in snap.iter_frames(table, DATE_COLUMNS):
+                if rows == 0:
+                    self._create_table(table, list(df.columns))
+                cols_sql = ", ".join(f'"{c}"' for c in df.columns)
+                marks = ", ".join("?" for _ in df.columns)
+                with perf.span("load.insert_batch", rows=len(df)):
+                    self.conn.executemany(f'INSERT OR IGNORE INTO "{table}" ({cols_sql}) VALUES ({marks})',
+                                          df.itertuples(index=False, name=None))
+                rows += len(df)
+                if progress:
+                    progress(f"Loading {table}", min(rows / total, 1.0))
+            self.conn.commit()
+            counts.append(rows)
+        return tuple(counts)
+
+    @perf.traced("load.snapshot_write")
+    def _write_snapshot(self, snap, digests):
+        try:
+            for table, source in digests.items():
+                _, untyped = snap.write(self.conn, table, source, DATE_COLUMNS)
+                if untyped:
+                    print(f"WARNING: {', '.join(untyped)} of '{table}' kept as text in the data snapshot, not every value is a date.")
+            print(f"Data snapshot saved in {snap.directory}")
+        except Exception as e:
+            print(f"Could not write the data snapshot ({e}), the next rebuild parses the JSON again.")
+
+    def _finish_ingest(self, n_cases, n_accounts):
+        # Rows sharing a primary key are only kept once
+        stored_cases = self.conn.execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+        stored_accounts = self.conn.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+        if (stored_cases, stored_accounts) != (n_cases, n_accounts):
+            print(f"WARNING: skipped {n_cases - stored_cases} duplicate cases, {n_accounts - stored_accounts} duplicate accounts.")
+
+        self._encode_keys()
+        self._add_epoch_columns()
+        self._build_aggregates()
+        return stored_cases, stored_accounts
+
+    # --- SCHEMA ---
+
+    def _create_table(self, table, columns):
+        schema = TABLE_SCHEMAS.get(table, {})
+        cols_sql = ", ".join(f'"{c}" {schema.get(c, "")}'.strip() for c in columns)
+        self.conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+        self.conn.execute(f'CREATE TABLE "{table}" ({cols_sql})')
+
+    @perf.traced("load.encode_keys")
+    def _encode_keys(self):
+        """Rewrites cases / accounts in the compact layout (see CATEGORY_COLUMNS / SURROGATE_KEYS)."""
+        start = time.perf_counter()
+        text_bytes = self._text_bytes_per_row()
+        db_before = self._db_bytes()
+
+        for table, columns in CATEGORY_COLUMNS.items():
+            for column in columns:
+                self.conn.execute(f'DROP TABLE IF EXISTS "lookup_{column}"')
+                self.conn.execute(f'CREATE TABLE "lookup_{column}" (code INTEGER PRIMARY KEY, value TEXT UNIQUE)')
+                self.conn.execute(f"""INSERT INTO "lookup_{column}" (value)
+                                      SELECT DISTINCT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL ORDER BY 1""")
+
+        # accounts first, cases look their account_id up in it
+        self._rewrite_table("accounts", unique_key=True)
+        self._rewrite_table("cases", unique_key=False, account_join=True)
+        self.conn.commit()
+
+        rows = self.conn.execute("SELECT COUNT(*) FROM cases").fetchone()[0]
+        self.memory_stats = {
+            "cases": rows,
+            "memory_bytes_per_row": {"before": round(float(text_bytes), 1), "after": round(float(self._code_bytes_per_row()), 1)},
+            "db_bytes_per_row": {"before": round(db_before / max(rows, 1), 1), "after": round(self._db_bytes() / max(rows, 1), 1)},
+        }
+        memory = self.memory_stats["memory_bytes_per_row"]
+        db = self.memory_stats["db_bytes_per_row"]
+        print(f"Integer keys and category codes in {(time.perf_counter() - start) * 1000:.0f}ms: "
+              f"ids + categories {memory['before']:.0f} -> {memory['after']:.0f} bytes per case in memory, "
+              f"database {db['before']:.0f} -> {db['after']:.0f} bytes per case")
+
+    def _rewrite_table(self, table, unique_key, account_join=False):
+        # One INSERT ... SELECT into the new layout, then swap the tables. Row order (and so the ids) follows the file.
+        key, natural_key = SURROGATE_KEYS[table]
+        schema = TABLE_SCHEMAS.get(table, {})
+        definitions = [f'"{key}" INTEGER PRIMARY KEY', f'"{natural_key}" TEXT{" UNIQUE" if unique_key else ""}']
+        targets = [natural_key]
+        selects = [f't."{natural_key}"']
+        joins = []
+        for column in self._columns(table):
+            if column == natural_key:
+                continue
+            if account_join and column == "account_sfid":
+                definitions.append('"account_id" INTEGER')
+                targets.append("account_id")
+                selects.append("a.account_id")
+                joins.append("LEFT JOIN accounts a ON a.account_sfid = t.account_sfid")
+            elif column in CATEGORY_COLUMNS.get(table, ()):
+                alias = f"l{len(joins)}"
+                definitions.append(f'"{column}_code" INTEGER')
+                targets.append(f"{column}_code")
+                selects.append(f"{alias}.code")
+                joins.append(f'LEFT JOIN "lookup_{column}" {alias} ON {alias}.value = t."{column}"')
+            else:
+                definitions.append(f'"{column}" {schema.get(column, "")}'.strip())
+                targets.append(column)
+                selects.append(f't."{column}"')
+
+        new_table = f"{table}_compact"
+        self.conn.execute(f'DROP TABLE IF EXISTS "{new_table}"')
+        self.conn.execute(f'CREATE TABLE "{new_table}" ({", ".join(definitions)})')
+        self.conn.execute(f"""
+            INSERT INTO "{new_table}" ({", ".join(f'"{c}"' for c in targets)})
+            SELECT {", ".join(selects)} FROM "{table}" t {" ".join(joins)} ORDER BY t.rowid
+        """)
+        self.conn.execute(f'DROP TABLE "{table}"')
+        self.conn.execute(f'ALTER TABLE "{new_table}" RENAME TO "{table}"')
+
+    def _columns(self, table):
+        return [row[1] for row in self.conn.execute(f'PRAGMA table_info("{table}")')]
+
+    def _db_bytes(self):
+        # Pages in use (freed pages of dropped tables don't count)
+        page_size = self.conn.execute("PRAGMA page_size").fetchone()[0]
+        pages = self.conn.execute("PRAGMA page_count").fetchone()[0] - self.conn.execute("PRAGMA freelist_count").fetchone()[0]
+        return pages * page_size
+
+    def _text_bytes_per_row(self):
+        # The key and category columns of a case as pandas holds text (object dtype strings)
+        columns = [SURROGATE_KEYS["cases"][1], "account_sfid", *CATEGORY_COLUMNS["cases"]]
+        sample = pd.read_sql(f"SELECT {', '.join(columns)} FROM cases LIMIT {MEMORY_SAMPLE_ROWS}", self.conn).astype(object)
+        return sample.memory_usage(deep=True, index=False).sum() / max(len(sample), 1)
+
+    def _code_bytes_per_row(self):
+        # The same columns as int32 keys + pandas categoricals (codes per row, values once)
+        codes = [f"{column}_code" for column in CATEGORY_COLUMNS["cases"]]
+        sample = pd.read_sql(f"SELECT case_id, account_id, {', '.join(codes)} FROM cases LIMIT {MEMORY_SAMPLE_ROWS}", self.conn)
+        compact = pd.DataFrame({
+            "case_id": sample["case_id"].astype(np.int32),
+            "account_id": sample["account_id"].fillna(0).astype(np.int32),
+        })
+        for column in CATEGORY_COLUMNS["cases"]:
+            values = [v for (v,) in self.conn.execute(f'SELECT value FROM "lookup_{column}" ORDER BY code')]
+            compact[column] = pd.Categorical.from_codes(sample[f"{column}_code"].fillna(0).astype(int) - 1, categories=values) \
+                if values else pd.Categorical([None] * len(sample))
+        return compact.memory_usage(deep=True, index=False).sum() / max(len(sample), 1)
+
+    @perf.traced("load.epoch_columns")
+    def _add_epoch_columns(self):
+        start = time.perf_counter()
+        for prefix, source in EPOCH_DATE_COLUMNS.items():
+            for suffix in ("ts", "day", "week"):
+                self.conn.execute(f'ALTER TABLE cases ADD COLUMN "{prefix}_{suffix}" INTEGER')
+
+            self.conn.execute(f"""
+                UPDATE cases SET
+                    {prefix}_ts = CAST(strftime('%s', {source}) AS INTEGER),
+                    {prefix}_day = CAST(strftime('%s', {source}) AS INTEGER) / 86400
+                WHERE {source} IS NOT NULL
+            """)
+            # ISO week = week of the Thursday in the same Monday-Sunday week (1970-01-01 was a Thursday)
+            thursday = f"(({prefix}_day - ({prefix}_day + 3) % 7 + 3) * 86400)"
+            self.conn.execute(f"""
+                UPDATE cases SET
+                    {prefix}_week = CAST(strftime('%Y', {thursday}, 'unixepoch') AS INTEGER) * 100
+                                    + (CAST(strftime('%j', {thursday}, 'unixepoch') AS INTEGER) - 1) / 7 + 1
+                WHERE {prefix}_day IS NOT NULL
+            """)
+        self.conn.commit()
+        print(f"Epoch date columns computed in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    @perf.traced("load.aggregates")
+    def _build_aggregates(self):
+        # Summary tables (agg_*) built once at load. The data is static afterwards, so the reports in
+        # graphs.py read these (a few hundred/thousand rows) instead of scanning cases on every click.
+        # All of them come out of a single pass over cases, see aggregates.py.
+        engine = AggregationEngine(self.conn)
+        engine.run()
+        engine.write()
+
+    # --- PERSISTENT CACHE ---
+    # The cache remembers size, mtime and SHA-256 of every source file.
+    # Size + mtime unchanged -> trusted as is. Only mtime changed -> re-hash, so a plain
+    # copy/touch doesn't force a rebuild. Anything else -> rebuild from the JSON.
+
+    @perf.traced("load.attach_cache")
+    def _attach_cache(self, cache_path, sources):
+        if not cache_path.exists():
+            return None
+
+        conn = connect(cache_path)
+        try:
+            info = dict(conn.execute("SELECT key, value FROM _cache_info").fetchall())
+            stored = {name: (size, mtime_ns, digest) for name, size, mtime_ns, digest
+                      in conn.execute("SELECT name, size, mtime_ns, sha256 FROM _source_files")}
+        except sqlite3.Error:
+            conn.close()
+            print("Cache file is unreadable, rebuilding...")
+            return None
+
+        if info.get("schema_version") != str(CACHE_SCHEMA_VERSION) or set(stored) != {p.name for p in sources}:
+            conn.close()
+            print("Cache layout changed, rebuilding...")
+            return None
+
+        for path in sources:
+            size, mtime_ns, digest = stored[path.name]
+            st = path.stat()
+            if st.st_size != size:
+                conn.close()
+                print(f"{path.name} changed, rebuilding cache...")
+                return None
+            if st.st_mtime_ns != mtime_ns:
+                if file_sha256(path) != digest:
+                    conn.close()
+                    print(f"{path.name} changed, rebuilding cache...")
+                    return None
+                conn.execute("UPDATE _source_files SET mtime_ns = ? WHERE name = ?", (st.st_mtime_ns, path.name))
+                conn.commit()
+
+        self.conn.close()
+        self.conn = conn
+        return int(info["cases"]), int(info["accounts"])
+
+    @perf.traced("load.build_cache")
+    def _build_cache(self, cache_path, sources, progress=None):
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(cache_path.name + ".tmp")
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+        # Build into a temp file and swap it in at the end, so a crash never leaves a half-built cache
+        self.conn.close()
+        self.conn = connect(tmp_path)
+
+        # Unchanged JSON + a snapshot of it: no JSON parsing at all (see snapshot.py)
+        digests = {path.name: file_sha256(path) for path in sources}
+        snap = snapshot.ArrowSnapshot(cache_path.parent / snapshot.SNAPSHOT_DIRNAME) if snapshot.available() else None
+        snapshot_sources = {"cases": (sources[0].name, digests[sources[0].name]),
+                            "accounts": (sources[1].name, digests[sources[1].name])}
+        if snap is not None and snap.matches(snapshot_sources):
+            counts = self._load_snapshot(snap, progress)
+        else:
+            counts = self._load_json(sources[0], sources[1], progress)
+            if snap is not None:
+                self._write_snapshot(snap, snapshot_sources)
+        n_cases, n_accounts = self._finish_ingest(*counts)
+
+        self.conn.execute("CREATE TABLE _cache_info (key TEXT PRIMARY KEY, value TEXT)")
+        self.conn.executemany("INSERT INTO _cache_info VALUES (?, ?)", [
+            ("schema_version", str(CACHE_SCHEMA_VERSION)),
+            ("cases", str(n_cases)),
+            ("accounts", str(n_accounts)),
+        ])
+        self.conn.execute("CREATE TABLE _source_files (name TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT)")
+        for path in sources:
+            st = path.stat()
+            self.conn.execute("INSERT INTO _source_files VALUES (?, ?, ?, ?)",
+                              (path.name, st.st_size, st.st_mtime_ns, digests[path.name]))
+        self.conn.commit()
+        self.conn.close()
+
+        os.replace(tmp_path, cache_path)
+        self.conn = connect(cache_path)
+        return n_cases, n_accounts
+
+    def _should_stream(self, *paths):
+        if self.streaming is not None:
+            return self.streaming
+        return sum(p.stat().st_size for p in paths) > STREAM_THRESHOLD_BYTES
+
+    # --- STREAMING INGESTION ---
+    # Parses the JSON array record by record and inserts in bounded batches,
+    # so peak memory stays around one batch no matter how big the export is.
+
+    @perf.traced("load.stream_table")
+    def _stream_table(self, path, table, progress=None):
+        total_bytes = max(path.stat().st_size, 1)
+        print(f"Streaming {path.name} into '{table}'...")
+
+        columns = []
+        batch = []
+        rows = 0
+
+        for record, bytes_read in iter_json_array(path):
+            if not columns:
+                columns = list(record)
+                self._create_table(table, columns)
+            else:
+                # Later records can carry keys the first one didn't have
+                for key in record:
+                    if key not in columns:
+                        rows += self._flush_batch(table, columns, self._record_rows(columns, batch))
+                        batch = []
+                        self.conn.execute(f'ALTER TABLE "{table}" ADD COLUMN "{key}"')
+                        columns.append(key)
+
+            batch.append(record)
+            if len(batch) >= STREAM_BATCH_ROWS:
+                rows += self._flush_batch(table, columns, self._record_rows(columns, batch))
+                batch = []
+                if progress:
+                    progress(f"Loading {table}", min(bytes_read / total_bytes, 1.0))
+
+        rows += self._flush_batch(table, columns, self._record_rows(columns, batch))
+        self.conn.commit()
+        if progress:
+            progress(f"Loading {table}", 1.0)
+        return rows
+
+    def _insert_frame(self, table, df, progress=None):
+        # The non-streaming path: same batches, cell conversion and progress as a streamed table
+        columns = list(df.columns)
+        self._create_table(table, columns)
+        total = max(len(df), 1)
+        rows = 0
+        for offset in range(0, len(df), STREAM_BATCH_ROWS):
+            batch = list(df.iloc[offset:offset + STREAM_BATCH_ROWS].itertuples(index=False, name=None))
+            rows += self._flush_batch(table, columns, batch)
+            if progress:
+                progress(f"Loading {table}", min(rows / total, 1.0))
+        self.conn.commit()
+        if progress:
+            progress(f"Loading {table}", 1.0)
+        return len(df)
+
+    @staticmethod
+    def _record_rows(columns, records):
+        return [tuple(rec.get(c) for c in columns) for rec in records]
+
+    def _flush_batch(self, table, columns, batch):
+        # batch: rows as tuples of raw values in column order
+        if not batch:
+            return 0
+        cols_sql = ", ".join(f'"{c}"' for c in columns)
+        marks = ", ".join("?" for _ in columns)
+        # The JSON parsing of a streamed table is its self time outside these batches
+        with perf.span("load.insert_batch", rows=len(batch)):
+            self.conn.executemany(
+                f'INSERT OR IGNORE INTO "{table}" ({cols_sql}) VALUES ({marks})',
+                (tuple(self._cell(c, v) for c, v in zip(columns, row)) for row in batch)
+            )
+            self.conn.commit()
+        return len(batch)
+
+    @staticmethod
+    def _cell(column, value):
+        # JSON values (streamed records) and pandas values (read_json frames) to what SQLite stores
+        if value is None or value is pd.NaT:
+            return None
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        if isinstance(value, datetime):
+            if isinstance(value, pd.Timestamp):
+                value = value.to_pydatetime()
+            if value.tzinfo is not None:
+                value = value.astimezone(timezone.utc).replace(tzinfo=None)
+            return value.isoformat(sep=" ")
+        if isinstance(value, np.generic):
+            value = value.item()
+        if isinstance(value, float) and value != value:
+            return None
+        if column in DATE_COLUMNS:
+            return normalize_timestamp(value)
+        return value
+
+    def _open_backend(self):
+        # The tables are final now; a columnar backend copies them once here
+        with perf.span("load.backend", backend=self.backend_name):
+            self.backend.close()
+            self.backend = open_backend(self.backend_name, self.conn)
+
+    def get_query(self, sql_query, params=None):
+        if not self.query_cache:
+            with self.db_lock, perf.span("sql", query=sql_query, backend=self.backend.name):
+                return self.backend.query(sql_query, params)
+
+        key = make_key(sql_query, params)
+        df = self.query_cache.get(key)
+        if df is None:
+            with self.db_lock, perf.span("sql", query=sql_query, backend=self.backend.name):
+                df = self.backend.query(sql_query, params)
+            self.query_cache.put(key, df)
+        return df
+
+    def query_cache_stats(self):
+        return self.query_cache.stats() if self.query_cache else {}
+
@@ -0,0 +1,147 @@
+# Headless export of every report, for servers / nightly runs (no Tk, no display needed).
+# The database is built (or validated) once in the main process, then each report is rendered in its
+# own worker process that opens the same on-disk SQLite cache read side by side with the others.
+# Matplotlib uses the Agg backend, so wall time scales with the number of cores.
+#
+# Writes <out>/<report>.png (and/or .svg) plus <out>/report_contexts.json with the data context,
+# AI system prompt and tables of every report.
+#
+# Usage (from the repo root or src):
+#   python src/export_charts.py [--out outputs] [--formats png,svg] [--workers N] [--reports top_products,case_types]
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+from data_manager import CACHE_FILENAME, DataManager
+from graphs import GraphLibrary, REPORT_KEYS
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_OUT_DIR = BASE_DIR / "outputs"
+CONTEXTS_FILENAME = "report_contexts.json"
+
+# Same size as the dashboard canvas
+FIGSIZE = (9, 6)
+DPI = 100
+
+# One GraphLibrary per worker process, opened by the pool initializer
+_graph_lib = None
+
+
+def _init_worker(cache_path):
+    global _graph_lib
+    dm = DataManager(cache_path=cache_path)
+    if not dm.load_data():
+        raise RuntimeError(f"Could not open the database at {cache_path}")
+    _graph_lib = GraphLibrary(dm)
+
+
+def render_report(key, out_dir, formats):
+    """Runs in a worker: computes one report, saves its figure in every format, returns its context."""
+    start = time.perf_counter()
+    data = _graph_lib.compute(key)
+    compute_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fig, ax = plt.subplots(figsize=FIGSIZE, dpi=DPI)
+    try:
+        _graph_lib.render(key, ax, data)
+        fig.tight_layout()
+        files = []
+        for fmt in formats:
+            path = Path(out_dir) / f"{key}.{fmt}"
+            fig.savefig(path, format=fmt)
+            files.append(path.name)
+    finally:
+        plt.close(fig)
+    render_s = time.perf_counter() - start
+
+    return {
+        "system_prompt": data['system_prompt'],
+        "data_context": data['data_context'],
+        "tables": data.get('tables', []),
+        "files": files,
+        "compute_s": round(compute_s, 3),
+        "render_s": round(render_s, 3),
+    }
+
+
+def export(out_dir=DEFAULT_OUT_DIR, formats=("png",), workers=None, reports=None):
+    """Returns (contexts by report key, errors by report key)."""
+    reports = list(reports or REPORT_KEYS)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # Built once here, the workers only attach to the finished file
+    dm = DataManager(persistent=True)
+    if not dm.load_data():
+        raise RuntimeError("Could not load the support cases data.")
+    cache_path = dm.cache_path or dm.cache_dir / CACHE_FILENAME
+    dm.conn.close()
+
+    workers = workers or min(len(reports), os.cpu_count() or 1)
+    contexts = {}
+    errors = {}
+    start = time.perf_counter()
+    # spawn: same as the AI worker, nothing inherited from the parent's SQLite connection
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=_init_worker, initargs=(str(cache_path),)) as pool:
+        futures = {pool.submit(render_report, key, str(out_dir), tuple(formats)): key for key in reports}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                contexts[key] = future.result()
+                print(f"  {key}: {', '.join(contexts[key]['files'])} "
+                      f"(compute {contexts[key]['compute_s']:.2f}s, render {contexts[key]['render_s']:.2f}s)")
+            except Exception as e:
+                errors[key] = str(e)
+                print(f"  {key}: FAILED - {e}")
+
+    elapsed = time.perf_counter() - start
+    document = {
+        "exported_at": datetime.now().isoformat(timespec="seconds"),
+        "elapsed_s": round(elapsed, 3),
+        "workers": workers,
+        "reports": {key: contexts[key] for key in reports if key in contexts},
+        "errors": errors,
+    }
+    (out_dir / CONTEXTS_FILENAME).write_text(json.dumps(document, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"Exported {len(contexts)}/{len(reports)} reports to {out_dir} in {elapsed:.2f}s with {workers} workers.")
+    return contexts, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render all reports without the GUI.")
+    parser.add_argument("--out", default=str(DEFAULT_OUT_DIR), help="output folder (default: outputs/)")
+    parser.add_argument("--formats", default="png", help="comma separated: png, svg (default: png)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per report, up to the CPU count)")
+    parser.add_argument("--reports", default=None, help="comma separated report keys (default: all)")
+    args = parser.parse_args()
+
+    formats = [f.strip().lower() for f in args.formats.split(",") if f.strip()]
+    unknown = set(formats) - {"png", "svg"}
+    if unknown:
+        parser.error(f"unsupported format: {', '.join(sorted(unknown))}")
+    reports = [r.strip() for r in args.reports.split(",")] if args.reports else None
+    if reports and set(reports) - set(REPORT_KEYS):
+        parser.error(f"unknown report: {', '.join(sorted(set(reports) - set(REPORT_KEYS)))} (choose from {', '.join(REPORT_KEYS)})")
+
+    try:
+        _, errors = export(args.out, formats, args.workers, reports)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+# Keeps already-rendered report canvases alive so switching back to a report only swaps widgets.
+# Size is estimated from the canvas pixels (Agg RGBA buffer + the Tk PhotoImage copy of it),
+# and the least recently shown canvases are destroyed once the total passes max_bytes.
+
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 160 * 1024 * 1024
+
+
+def canvas_bytes(width, height):
+    return width * height * 4 * 2
+
+
+class FigureCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, on_evict=None):
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.entries = OrderedDict()  # key -> (entry, bytes)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        if key not in self.entries:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return self.entries[key][0]
+
+    def put(self, key, entry, size, pinned=None):
+        self.discard(key)
+        self.entries[key] = (entry, size)
+        self.current_bytes += size
+        self._evict(pinned or key)
+
+    def resize(self, key, size):
+        # The visible canvas re-renders itself on window resizes, keep its footprint up to date
+        if key in self.entries:
+            entry, old = self.entries[key]
+            self.entries[key] = (entry, size)
+            self.current_bytes += size - old
+            self._evict(key)
+
+    def discard(self, key):
+        if key in self.entries:
+            entry, size = self.entries.pop(key)
+            self.current_bytes -= size
+            if self.on_evict:
+                self.on_evict(entry)
+
+    def clear(self):
+        for key in list(self.entries):
+            self.discard(key)
+
+    def _evict(self, pinned):
+        # Oldest first, but never the canvas currently on screen
+        for key in list(self.entries):
+            if self.current_bytes <= self.max_bytes:
+                break
+            if key == pinned:
+                continue
+            self.discard(key)
+            self.evictions += 1
+
+    def stats(self):
+        return {
+            "entries": len(self.entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
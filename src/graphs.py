@@ -5,30 +5,115 @@ import pandas as pd
 import numpy as np
 import matplotlib.dates as mdates
 
+import perf
+from prompt_builder import table_payload
+
+# Every report is split in two steps:
+#   compute_<report>(cancel) -> SQL + pandas/numpy math + AI context. Pure data, safe to run on a worker thread.
+#   render_<report>(ax, data) -> only Matplotlib calls, runs on the Tk main thread.
+# plot_<report>(ax) still does both in one go for callers that don't care.
+# Besides the short data_context, compute_<report> also returns 'tables': the report's aggregated data with
+# the most important rows first. The AI gets as many of those rows as fit its context (prompt_builder.py).
+REPORT_KEYS = [
+    "top_products",
+    "severity_stack",
+    "case_types",
+    "global_hotspots",
+    "ticket_density",
+    "industry_struggles",
+    "volume_over_time",
+    "resolution_time",
+    "backlog_growth",
+]
+
+
+class ReportCancelled(Exception):
+    pass
+
+
+def weighted_median(values, weights):
+    # values sorted ascending, weights = how many times each value occurs.
+    # Same result as pandas' median on the expanded data (mean of the two middle items on even counts)
+    cumulative = np.cumsum(weights)
+    total = cumulative[-1]
+    lower = values[np.searchsorted(cumulative, (total + 1) // 2)]
+    upper = values[np.searchsorted(cumulative, total // 2 + 1)]
+    return (lower + upper) / 2
+
+# The queries below read the summary tables (agg_*) that data_manager.py builds once at load time,
+# so switching reports doesn't rescan the raw cases table.
+
 class GraphLibrary:
     def __init__(self, db_manager):
         self.db = db_manager
+
+    def compute(self, key, cancel=None):
+        # Self time of this span (outside its "sql" spans) is the pandas/numpy post-processing
+        with perf.span("report.compute", report=key):
+            data = getattr(self, f"compute_{key}")(cancel)
+        self._checkpoint(cancel)
+        return data
+
+    def render(self, key, ax, data):
+        with perf.span("report.render", report=key):
+            getattr(self, f"render_{key}")(ax, data)
+        return data['system_prompt'], data['data_context']
+
+    def plot(self, key, ax):
+        return self.render(key, ax, self.compute(key))
+
+    @staticmethod
+    def _checkpoint(cancel):
+        # Stale work (the user already clicked another report) stops at the next checkpoint
+        if cancel is not None and cancel.is_set():
+            raise ReportCancelled()
+
+    def _query(self, sql, cancel):
+        self._checkpoint(cancel)
+        df = self.db.get_query(sql) # uses a function from data_manager.py to get the results of the query
+        self._checkpoint(cancel)
+        return df
+
+    def plot_top_products(self, ax):
+        return self.plot("top_products", ax)
+
+    def plot_severity_stack(self, ax):
+        return self.plot("severity_stack", ax)
+
+    def plot_case_types(self, ax):
+        return self.plot("case_types", ax)
+
+    def plot_global_hotspots(self, ax):
+        return self.plot("global_hotspots", ax)
+
+    def plot_ticket_density(self, ax):
+        return self.plot("ticket_density", ax)
+
+    def plot_industry_struggles(self, ax):
+        return self.plot("industry_struggles", ax)
+
+    def plot_volume_over_time(self, ax):
+        return self.plot("volume_over_time", ax)
+
+    def plot_resolution_time(self, ax):
+        return self.plot("resolution_time", ax)
+
+    def plot_backlog_growth(self, ax):
+        return self.plot("backlog_growth", ax)
         
     # Below we generate multiple graphs that i believe have value when doing a data analysis.
     
     # 1 - TOP 10 PRODUCTS GRAPH
     
-    def plot_top_products(self, ax):
+    def compute_top_products(self, cancel=None):
         
-        sql = """ SELECT case_product, COUNT(*) as count
-            FROM cases
+        sql = """ SELECT case_product, SUM(cases) as count
+            FROM agg_product_severity_type
             GROUP BY case_product
-            ORDER BY count DESC
+            ORDER BY count DESC, case_product NULLS FIRST
             LIMIT 10
         """
-        df = self.db.get_query(sql) # uses a function from data_manager.py to get the results of the query
-        
-        # Plotting the graph
-        
-        ax.barh(df['case_product'], df['count'], color='#3498db')
-        ax.invert_yaxis() # makes the most popular products the top ones
-        ax.set_title('Top Products by Ticket Number')
-        ax.set_xlabel('Number of Cases')
+        df = self._query(sql, cancel)
         
         # 1.1 - AI SPECIFIC CONTEXT
         
@@ -52,33 +137,79 @@ class GraphLibrary:
             "Otherwise, describe the distribution as 'Balanced'."
         )
         
-        return system_prompt, data_context
+        # Every product for the AI, not only the charted top 10
+        products = self._query("SELECT case_product as product, SUM(cases) as cases FROM agg_product_severity_type GROUP BY case_product ORDER BY cases DESC, product NULLS FIRST", cancel)
+        products['share_pct'] = products['cases'] / products['cases'].sum() * 100
+        tables = [table_payload("Cases per product", products)]
+
+        return {'df': df, 'system_prompt': system_prompt, 'data_context': data_context, 'tables': tables}
+
+    def render_top_products(self, ax, data):
+        df = data['df']
+        
+        # Plotting the graph
+        
+        ax.barh(df['case_product'], df['count'], color='#3498db')
+        ax.invert_yaxis() # makes the most popular products the top ones
+        ax.set_title('Top Products by Ticket Number')
+        ax.set_xlabel('Number of Cases')
         
     # 2 - SEVERITY BY PRODUCT (Stacked)
         
-    def plot_severity_stack(self, ax):
-        """
-        Renders a grouped bar chart for better legibility of low-volume/high-severity cases.
+    def compute_severity_stack(self, cancel=None):
+        # Top 10 Products and their severity split in one query
+        sql = """
+            WITH top_products AS (
+                SELECT case_product
+                FROM agg_product_severity_type
+                GROUP BY case_product
+                ORDER BY SUM(cases) DESC, case_product NULLS FIRST
+                LIMIT 10
+            )
+            SELECT a.case_product, a.case_severity, SUM(a.cases) as count
+            FROM agg_product_severity_type a
+            JOIN top_products t ON a.case_product = t.case_product
+            GROUP BY a.case_product, a.case_severity
+            ORDER BY a.case_product NULLS FIRST, a.case_severity NULLS FIRST
         """
-        # 1. Fetch Top 5 Products
-        top_prod_sql = "SELECT case_product FROM cases GROUP BY case_product ORDER BY COUNT(*) DESC LIMIT 10"
-        top_prods = self.db.get_query(top_prod_sql)['case_product'].tolist()
-        
-        # 2. Query data for these products
-        sql = f"SELECT case_product, case_severity, COUNT(*) as count FROM cases WHERE case_product IN ({str(top_prods)[1:-1]}) GROUP BY case_product, case_severity"
-        df = self.db.get_query(sql)
+        df = self._query(sql, cancel)
         
         # Pivot and Normalize to Percentages
         pivot_df = df.pivot(index='case_product', columns='case_severity', values='count').fillna(0)
         pivot_perc = pivot_df.div(pivot_df.sum(axis=1), axis=0) * 100
         
-        # Define strict order and color scheme
-        severity_colors = {'Low': '#2ecc71', 'Normal': '#f1c40f', 'Medium': '#e67e22', 'High': '#e74c3c', 'Urgent': '#8b0000'}
+        # Define strict order
         desired_order = [s for s in ['Low', 'Normal', 'Medium', 'High', 'Urgent'] if s in pivot_perc.columns]
         pivot_perc = pivot_perc[desired_order]
+        
+        # AI Context Update
+        worst_prod = pivot_perc['Urgent'].idxmax() if 'Urgent' in pivot_perc else "N/A"
+        data_context = f"Analysis of top 10 products. Product with highest urgent ratio: {worst_prod}."
+        system_prompt = "You are a Risk Auditor. Identify which product has the most volatile severity distribution."
+
+        # Severity counts of every product, biggest products first
+        all_sev = self._query("SELECT case_product, case_severity, SUM(cases) as cases FROM agg_product_severity_type GROUP BY case_product, case_severity ORDER BY case_product NULLS FIRST, case_severity NULLS FIRST", cancel)
+        counts = all_sev.pivot(index='case_product', columns='case_severity', values='cases').fillna(0)
+        counts = counts[[s for s in ['Urgent', 'High', 'Medium', 'Normal', 'Low'] if s in counts.columns]]
+        counts.insert(0, 'total', counts.sum(axis=1))
+        if 'Urgent' in counts:
+            counts['urgent_pct'] = counts['Urgent'] / counts['total'] * 100
+        counts = counts.sort_values('total', ascending=False).rename_axis('product').reset_index()
+        tables = [table_payload("Cases per product and severity", counts)]
+
+        return {'pivot_perc': pivot_perc, 'system_prompt': system_prompt, 'data_context': data_context, 'tables': tables}
+
+    def render_severity_stack(self, ax, data):
+        """
+        Renders a grouped bar chart for better legibility of low-volume/high-severity cases.
+        """
+        pivot_perc = data['pivot_perc']
+        
+        # Color scheme
+        severity_colors = {'Low': '#2ecc71', 'Normal': '#f1c40f', 'Medium': '#e67e22', 'High': '#e74c3c', 'Urgent': '#8b0000'}
 
         # IMPROVEMENT: Use Grouped Bar instead of Stacked for clarity
-        pivot_perc.plot(kind='barh', ax=ax, color=[severity_colors[s] for s in desired_order], width=0.8)
+        pivot_perc.plot(kind='barh', ax=ax, color=[severity_colors[s] for s in pivot_perc.columns], width=0.8)
 
         # Better Labeling: Place text at the end of bars rather than inside
         for p in ax.patches:
@@ -92,19 +223,12 @@ class GraphLibrary:
         ax.set_ylabel('')
         ax.set_xlim(0, 115) # Extra space for the labels
         ax.legend(title='Severity', loc='lower right', fontsize='small')
-        
-        # AI Context Update
-        worst_prod = pivot_perc['Urgent'].idxmax() if 'Urgent' in pivot_perc else "N/A"
-        data_context = f"Analysis of top 10 products. Product with highest urgent ratio: {worst_prod}."
-        system_prompt = "You are a Risk Auditor. Identify which product has the most volatile severity distribution."
-
-        return system_prompt, data_context
     
     # 3 - CASE TYPES (Grouped "Other")
 
-    def plot_case_types(self, ax):
-        sql = "SELECT case_type, COUNT(*) as count FROM cases GROUP BY case_type ORDER BY count DESC"
-        df = self.db.get_query(sql)
+    def compute_case_types(self, cancel=None):
+        sql = "SELECT case_type, SUM(cases) as count FROM agg_product_severity_type GROUP BY case_type ORDER BY count DESC, case_type NULLS FIRST"
+        df = self._query(sql, cancel)
         
         # Group small slices
         total_cases = df['count'].sum()
@@ -120,18 +244,6 @@ class GraphLibrary:
         else:
             df_final = df_big
         
-        # Plotting
-        
-        ax.pie(
-            df_final['count'],
-            labels=df_final['case_type'],
-            autopct='%1.1f%%',
-            startangle=90,
-            radius=0.85,
-            wedgeprops=dict(width=0.3)
-        )
-        ax.set_title('Distribution of Case Types')
-        
         # 3.1 - AI CONTEXT 
         
         # We fetch the top 3 specific types so the AI doesn't have to guess
@@ -153,28 +265,41 @@ class GraphLibrary:
             "If 'Question' or 'Training' is dominant, recommend 'Update Knowledge Base'. "
         )    
         
-        return system_prompt, data_context
+        # All types, including the ones grouped into 'Other' on the chart
+        types = df.rename(columns={'count': 'cases'})
+        types['share_pct'] = types['cases'] / total_cases * 100
+        tables = [table_payload("Cases per type", types)]
+
+        return {'df_final': df_final, 'system_prompt': system_prompt, 'data_context': data_context, 'tables': tables}
+
+    def render_case_types(self, ax, data):
+        df_final = data['df_final']
+        
+        # Plotting
+        
+        ax.pie(
+            df_final['count'],
+            labels=df_final['case_type'],
+            autopct='%1.1f%%',
+            startangle=90,
+            radius=0.85,
+            wedgeprops=dict(width=0.3)
+        )
+        ax.set_title('Distribution of Case Types')
     
     # 4 - GLOBAL HEAT MAP (Countries by case volume)
     
-    def plot_global_hotspots(self, ax):
+    def compute_global_hotspots(self, cancel=None):
         
         sql = """
-            SELECT a.account_country, COUNT(c.case_sfid) as count
-            FROM cases c
-            JOIN accounts a ON c.account_sfid = a.account_sfid
-            GROUP BY a.account_country
-            ORDER BY count DESC
+            SELECT account_country, SUM(cases) as count
+            FROM agg_country_industry
+            GROUP BY account_country
+            HAVING count > 0
+            ORDER BY count DESC, account_country NULLS FIRST
             LIMIT 10
         """
-        df = self.db.get_query(sql)
-        
-        # Plotting
-        
-        ax.bar(df['account_country'], df['count'], color="#ab6ec4")
-        ax.set_title('Top 10 Countries by Support Load')
-        ax.set_ylabel('Total Cases')
-        ax.tick_params(axis='x', rotation=45)
+        df = self._query(sql, cancel)
         
         # 4.1 - AI CONTEXT (takes into account Canadian bias)
         
@@ -207,46 +332,46 @@ class GraphLibrary:
             "Identify if we need language support for the biggest non-Canadian region."
         )
         
-        return system_prompt, data_context
+        # Every country, not only the charted top 10
+        countries = self._query("""
+            SELECT account_country as country, SUM(cases) as cases
+            FROM agg_country_industry
+            GROUP BY account_country
+            HAVING SUM(cases) > 0
+            ORDER BY cases DESC, country NULLS FIRST
+        """, cancel)
+        countries['share_pct'] = countries['cases'] / countries['cases'].sum() * 100
+        tables = [table_payload("Cases per country", countries)]
+
+        return {'df': df, 'system_prompt': system_prompt, 'data_context': data_context, 'tables': tables}
+
+    def render_global_hotspots(self, ax, data):
+        df = data['df']
+        
+        # Plotting
+        
+        ax.bar(df['account_country'], df['count'], color="#ab6ec4")
+        ax.set_title('Top 10 Countries by Support Load')
+        ax.set_ylabel('Total Cases')
+        ax.tick_params(axis='x', rotation=45)
     
     # 5 - TICKET DENSITY ANALYSIS
     
-    def plot_ticket_density(self, ax):
+    def compute_ticket_density(self, cancel=None):
 
         sql = """
-            WITH CaseCounts AS (
-                SELECT 
-                    a.account_country, 
-                    COUNT(c.case_sfid) as total_cases
-                FROM accounts a
-                LEFT JOIN cases c ON a.account_sfid = c.account_sfid
-                GROUP BY a.account_country
-            ),
-            AccountCounts AS (
-                SELECT 
-                    account_country, 
-                    COUNT(DISTINCT account_sfid) as total_customers
-                FROM accounts
-                GROUP BY account_country
-            )
             SELECT 
-                ac.account_country,
-                (CAST(cc.total_cases AS FLOAT) / ac.total_customers) as density
-            FROM AccountCounts ac
-            JOIN CaseCounts cc ON ac.account_country = cc.account_country
-            WHERE ac.total_customers > 5  
-            ORDER BY density DESC
+                account_country,
+                (CAST(SUM(cases) AS DOUBLE) / SUM(accounts)) as density
+            FROM agg_country_industry
+            WHERE account_country IS NOT NULL
+            GROUP BY account_country
+            HAVING SUM(accounts) > 5
+            ORDER BY density DESC, account_country
             LIMIT 10
         """
         
-        df = self.db.get_query(sql)
-        
-        # Plotting
-        
-        ax.barh(df['account_country'], df['density'], color='#d35400') 
-        ax.invert_yaxis()
-        ax.set_title('Support Density (Tickets per Account)')
-        ax.set_xlabel('Avg Tickets per Customer')
+        df = self._query(sql, cancel)
 
         # 5.1 - AI CONTEXT 
         
@@ -279,26 +404,42 @@ class GraphLibrary:
             "Only flag a 'Problem Area' if a region is mathematically HIGHER than Canada."
         )
         
-        return system_prompt, data_context
+        # Every country with enough accounts, highest density first
+        density = self._query("""
+            SELECT account_country as country, SUM(cases) as cases, SUM(accounts) as accounts,
+                   (CAST(SUM(cases) AS DOUBLE) / SUM(accounts)) as density
+            FROM agg_country_industry
+            WHERE account_country IS NOT NULL
+            GROUP BY account_country
+            HAVING SUM(accounts) > 5
+            ORDER BY density DESC, country
+        """, cancel)
+        tables = [table_payload("Tickets per account by country", density)]
+
+        return {'df': df, 'system_prompt': system_prompt, 'data_context': data_context, 'tables': tables}
+
+    def render_ticket_density(self, ax, data):
+        df = data['df']
+        
+        # Plotting
+        
+        ax.barh(df['account_country'], df['density'], color='#d35400') 
+        ax.invert_yaxis()
+        ax.set_title('Support Density (Tickets per Account)')
+        ax.set_xlabel('Avg Tickets per Customer')
     
     # 6 - INDUSTRY STRUGGLES
     
-    def plot_industry_struggles(self, ax):
+    def compute_industry_struggles(self, cancel=None):
         sql = """
-            SELECT a.account_industry, COUNT(c.case_sfid) as count 
-            FROM cases c
-            JOIN accounts a ON c.account_sfid = a.account_sfid
-            GROUP BY a.account_industry
-            ORDER BY count DESC
+            SELECT account_industry, SUM(cases) as count 
+            FROM agg_country_industry
+            GROUP BY account_industry
+            HAVING count > 0
+            ORDER BY count DESC, account_industry NULLS FIRST
             LIMIT 10
         """
-        df = self.db.get_query(sql)
-        
-        # Plotting
-        ax.barh(df['account_industry'], df['count'], color='#16a085') 
-        ax.invert_yaxis()
-        ax.set_title('Total Cases by Client Industry')
-        ax.set_xlabel('Number of Cases')
+        df = self._query(sql, cancel)
 
         # 6.1 - AI CONTEXT 
         
@@ -334,25 +475,46 @@ class GraphLibrary:
             "Do not perform your own math comparison; trust the Status provided."
         )
         
-        return system_prompt, data_context
+        # Every industry with its share of the volume
+        industries = self._query("""
+            SELECT account_industry as industry, SUM(cases) as cases, SUM(accounts) as accounts
+            FROM agg_country_industry
+            GROUP BY account_industry
+            HAVING SUM(cases) > 0
+            ORDER BY cases DESC, industry NULLS FIRST
+        """, cancel)
+        industries['share_pct'] = industries['cases'] / industries['cases'].sum() * 100
+        tables = [table_payload("Cases per industry", industries)]
+
+        return {'df': df, 'system_prompt': system_prompt, 'data_context': data_context, 'tables': tables}
+
+    def render_industry_struggles(self, ax, data):
+        df = data['df']
+        
+        # Plotting
+        ax.barh(df['account_industry'], df['count'], color='#16a085') 
+        ax.invert_yaxis()
+        ax.set_title('Total Cases by Client Industry')
+        ax.set_xlabel('Number of Cases')
     
     # 7 - VOLUME OVER TIME (Weekly)
     
-    def plot_volume_over_time(self, ax):
+    def compute_volume_over_time(self, cancel=None):
+        # week is the ISO week (YYYYWW) precomputed at load time by data_manager.py
         sql = """
-            SELECT strftime('%Y-%m-%d', case_created_date) as date, COUNT(*) as count
-            FROM cases
-            GROUP BY date
-            ORDER BY date ASC
+            SELECT week, created as count
+            FROM agg_weekly
+            ORDER BY week ASC
         """
         
-        df = self.db.get_query(sql)
-        df['date'] = pd.to_datetime(df['date'])
-        df.set_index('date', inplace=True)
-        # Resample to weekly to smooth out noise
+        df = self._query(sql, cancel)
+        # ISO weeks run Monday-Sunday, so each one is labelled by its Sunday (same bins as resample('W'))
+        df['date'] = pd.to_datetime(df['week'].astype(str) + '7', format='%G%V%u')
+        df = df[['date', 'count']].set_index('date')
+        # Resample fills in weeks that had no cases at all
         df_weekly = df.resample('W').sum().reset_index()
         
-        ax.plot(df_weekly['date'], df_weekly['count'], marker='o', linestyle='-', color="#4291c5", label="Actual Volume")
+        data = {'df_weekly': df_weekly}
         
         if len(df_weekly) > 1:
             # Convert dates to numbers for regression
@@ -363,25 +525,16 @@ class GraphLibrary:
             z = np.polyfit(dates_num, df_weekly['count'], 1) 
             p = np.poly1d(z)
             
-            # Plot the 'Normalized' Trend Line for existing data
-            ax.plot(df_weekly['date'], p(dates_num), "r--", alpha=0.6, linewidth=2, label="Trend")
+            # 'Normalized' Trend Line for existing data
+            data['trend'] = p(dates_num)
             
             # Calculate Future Projection (e.g., next 4 weeks)
             last_date = df_weekly['date'].iloc[-1]
             future_dates = pd.date_range(start=last_date, periods=5, freq='W')[1:] # Generate 4 new weeks
             future_num = mdates.date2num(future_dates)
             
-            # Plot the Projection
-            ax.plot(future_dates, p(future_num), "r:", alpha=0.6, linewidth=2, label="Projected Growth")
-            
-            # Add legend to distinguish lines
-            ax.legend()
-
-        ax.set_title('Weekly Ticket Volume Trend')
-        ax.set_ylabel('New Cases (Weekly)')
-        ax.grid(True, alpha=0.3)
-        
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
+            data['future_dates'] = future_dates
+            data['projection'] = p(future_num)
         
         # 7.1 - AI CONTEXT 
         
@@ -420,34 +573,54 @@ class GraphLibrary:
             "If change is < -15%, recommend 'Review Efficiency'."
         )
         
-        return system_prompt, data_context
+        data['system_prompt'] = system_prompt
+        data['data_context'] = data_context
+
+        # Weekly volume for the AI, most recent weeks first
+        weeks = df_weekly.rename(columns={'date': 'week_ending', 'count': 'cases'}).iloc[::-1]
+        data['tables'] = [table_payload("Cases created per week", weeks)]
+        return data
+
+    def render_volume_over_time(self, ax, data):
+        df_weekly = data['df_weekly']
+        
+        ax.plot(df_weekly['date'], df_weekly['count'], marker='o', linestyle='-', color="#4291c5", label="Actual Volume")
+        
+        if 'trend' in data:
+            # Plot the 'Normalized' Trend Line for existing data
+            ax.plot(df_weekly['date'], data['trend'], "r--", alpha=0.6, linewidth=2, label="Trend")
+            
+            # Plot the Projection
+            ax.plot(data['future_dates'], data['projection'], "r:", alpha=0.6, linewidth=2, label="Projected Growth")
+            
+            # Add legend to distinguish lines
+            ax.legend()
+
+        ax.set_title('Weekly Ticket Volume Trend')
+        ax.set_ylabel('New Cases (Weekly)')
+        ax.grid(True, alpha=0.3)
+        
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%b %Y'))
     
     # 8 - TIME TO RESOLUTION (histogram)
     
-    def plot_resolution_time(self, ax):
+    def compute_resolution_time(self, cancel=None):
+        # Closed cases bucketed by minutes-to-close at load time, 'cases' is how many fell in each bucket
         sql = """
-            SELECT (julianday(case_closed_date) - julianday(case_created_date)) as days
-            FROM cases
-            WHERE case_status = 'Closed' AND case_closed_date IS NOT NULL
+            SELECT minutes / 1440.0 as days, cases
+            FROM agg_resolution
+            ORDER BY days ASC
         """
         
-        df = self.db.get_query(sql)
-        
-        # Plotting
-        
-        ax.hist(df['days'], bins=40, color="#9949bb", edgecolor='white', alpha=0.7)
-        ax.set_title('Time to Resolution Distribution')
-        ax.set_xlabel('Days to Close')
-        ax.set_ylabel('Number of Cases')
-        
-        # Dynamically set the limit instead of hardcoding 100
-        # Adding a 10% buffer to the max value so the bar doesn't touch the edge
+        df = self._query(sql, cancel)
         
         if not df.empty:
-            avg_days = df['days'].mean()
-            median_days = df['days'].median()
+            # Weighted stats, since every row stands for 'cases' tickets
+            total = df['cases'].sum()
+            avg_days = (df['days'] * df['cases']).sum() / total
+            median_days = weighted_median(df['days'].to_numpy(), df['cases'].to_numpy())
             max_days = df['days'].max()
-            std_dev = df['days'].std()
+            std_dev = np.sqrt(((df['days'] - avg_days) ** 2 * df['cases']).sum() / (total - 1)) if total > 1 else np.nan
             
             data_context = (
                 f"Average Resolution: {avg_days:.1f} days. "
@@ -464,36 +637,48 @@ class GraphLibrary:
             "If they are close, the process is consistent."
         )
         
-        return system_prompt, data_context
+        # Percentiles and coarse buckets of the whole distribution
+        if not df.empty:
+            order = np.argsort(df['days'].to_numpy())
+            days = df['days'].to_numpy()[order]
+            cumulative = np.cumsum(df['cases'].to_numpy()[order]) / df['cases'].sum()
+            pcts = [50, 75, 90, 95, 99, 25, 10]
+            percentiles = pd.DataFrame({
+                'percentile': [f"p{p}" for p in pcts],
+                'days': [days[min(np.searchsorted(cumulative, p / 100), len(days) - 1)] for p in pcts],
+            })
+            edges = [0, 1, 2, 7, 14, 30, 90, np.inf]
+            labels = ['<1', '1-2', '2-7', '7-14', '14-30', '30-90', '90+']
+            buckets = df.groupby(pd.cut(df['days'], edges, labels=labels, right=False), observed=False)['cases'].sum().reset_index()
+            buckets.columns = ['days_to_close', 'cases']
+            buckets['share_pct'] = buckets['cases'] / buckets['cases'].sum() * 100
+            tables = [table_payload("Resolution time percentiles", percentiles), table_payload("Cases by days to close", buckets)]
+        else:
+            tables = []
+
+        return {'df': df, 'system_prompt': system_prompt, 'data_context': data_context, 'tables': tables}
+
+    def render_resolution_time(self, ax, data):
+        df = data['df']
+        
+        # Plotting
+        
+        ax.hist(df['days'], bins=40, weights=df['cases'], color="#9949bb", edgecolor='white', alpha=0.7)
+        ax.set_title('Time to Resolution Distribution')
+        ax.set_xlabel('Days to Close')
+        ax.set_ylabel('Number of Cases')
     
     # 9 - BACKLOG GROWTH (unfinished tasks)
     
-    def plot_backlog_growth(self, ax):
+    def compute_backlog_growth(self, cancel=None):
         
-        #date of creation
-        df_created = self.db.get_query("SELECT strftime('%Y-%m-%d', case_created_date) as date, COUNT(*) as val FROM cases GROUP BY date")
-        # date of closure
-        df_closed = self.db.get_query("SELECT strftime('%Y-%m-%d', case_closed_date) as date, COUNT(*) as val FROM cases WHERE case_closed_date IS NOT NULL GROUP BY date")
-        
-        df_created['date'] = pd.to_datetime(df_created['date'])
-        df_closed['date'] = pd.to_datetime(df_closed['date'])
-        
-        merged = pd.merge(df_created, df_closed, on='date', how='outer', suffixes=('_new','_resolved')).fillna(0)
-        merged = merged.sort_values('date')
+        # cases created and closed per day (days since 1970-01-01), precomputed at load time
+        merged = self._query("SELECT day, created as val_new, closed as val_resolved FROM agg_daily ORDER BY day", cancel)
+        merged['date'] = pd.to_datetime(merged['day'], unit='D')
         
         merged['total_created'] = merged['val_new'].cumsum()
         merged['total_closed'] = merged['val_resolved'].cumsum()
         
-        ax.plot(merged['date'], merged['total_created'], color='red', label='Total Received')
-        ax.plot(merged['date'], merged['total_closed'], color='green', label='Total Resolved')
-        
-        ax.fill_between(merged['date'], merged['total_created'], merged['total_closed'], color='gray', alpha=0.1)
-        
-        ax.set_title('Backlog Growth (Received vs Resolved)')
-        ax.legend()
-        ax.grid(True)
-        ax.figure.autofmt_xdate()
-        
         # 9.1 - AI CONTEXT
         
         current_backlog = merged.iloc[-1]['total_created'] - merged.iloc[-1]['total_closed']
@@ -511,4 +696,23 @@ class GraphLibrary:
             "If positive, estimate how many extra agents are needed (assuming 1 agent handles 5 tickets/day)."
         )
         
-        return system_prompt, data_context#
\ No newline at end of file
+        # Weekly created / closed / open backlog, most recent weeks first
+        weekly = merged.set_index('date')[['val_new', 'val_resolved']].resample('W').sum()
+        weekly['backlog'] = (weekly['val_new'] - weekly['val_resolved']).cumsum()
+        weekly = weekly.rename_axis('week_ending').rename(columns={'val_new': 'created', 'val_resolved': 'closed'}).reset_index().iloc[::-1]
+        tables = [table_payload("Backlog per week", weekly)]
+
+        return {'merged': merged, 'system_prompt': system_prompt, 'data_context': data_context, 'tables': tables}
+
+    def render_backlog_growth(self, ax, data):
+        merged = data['merged']
+        
+        ax.plot(merged['date'], merged['total_created'], color='red', label='Total Received')
+        ax.plot(merged['date'], merged['total_closed'], color='green', label='Total Resolved')
+        
+        ax.fill_between(merged['date'], merged['total_created'], merged['total_closed'], color='gray', alpha=0.1)
+        
+        ax.set_title('Backlog Growth (Received vs Resolved)')
+        ax.legend()
+        ax.grid(True)
+        ax.figure.autofmt_xdate()
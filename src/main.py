@@ -2,16 +2,32 @@ import customtkinter as ctk
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 import matplotlib.pyplot as plt
 import threading 
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Logic modules
+import perf
 from data_manager import DataManager
-from graphs import GraphLibrary
-from ai_analyst import AIAnalyst
+from graphs import GraphLibrary, ReportCancelled
+from ai_analyst import AIAnalyst, STATE_LOADING, STATE_FAILED
+from prefetch import ReportPrefetcher
+from figure_cache import FigureCache, canvas_bytes
+from batch_analysis import BatchAnalysis
+from perf_panel import PerfPanel
 
 # Dark and Modern
 ctk.set_appearance_mode("dark")
 ctk.set_default_color_theme("blue")
 
+# Background warm-up of the reports after startup (see prefetch.py).
+# Reports opened most often go first, ties follow this order. None = navbar order.
+PREFETCH_ORDER = None
+PREFETCH_WORKERS = 2
+
+# Streamed AI text is pushed to the textbox in batches, at most this often (seconds)
+AI_STREAM_FLUSH_S = 0.05
+AI_STREAM_FLUSH_MS = int(AI_STREAM_FLUSH_S * 1000)
+
 class AnalyticsApp(ctk.CTk):
     def __init__(self):
         super().__init__()
@@ -19,16 +35,40 @@ class AnalyticsApp(ctk.CTk):
         self.title("SQL, Python and AI Powered Data Analysis Tool")
         self.geometry("1600x900")
         
+        # Startup progress (big exports are streamed in batches and can take a while)
+        self.loading_label = ctk.CTkLabel(self, text="Loading data...", font=("Inter", 16))
+        self.loading_label.place(relx=0.5, rely=0.5, anchor="center")
+
         # Initialize Logic Modules
-        self.db_manager = DataManager()
-        if not self.db_manager.load_data():
+        self.db_manager = DataManager(persistent=True)
+        self.data_loaded = self.db_manager.load_data(progress=self.show_load_progress)
+        if not self.data_loaded:
             self.show_error("Data Error", "Could not load data files.\nCheck console for details.")
+        self.loading_label.destroy()
 
         self.graph_lib = GraphLibrary(self.db_manager)
-        self.ai_analyst = AIAnalyst() 
+        self.ai_analyst = AIAnalyst() # the model itself is loaded in the background once the window is up
+        self.ai_busy = False
+        self.ai_request = 0
+        self.ai_job = None # AIRequest of the single analysis being streamed into the box
+        self.batch_cancel = None # set while "Analyse All Reports" runs
+        self.batch_request = None # ai_request value while the box shows the batch output
+        self.batch_progress = ""
 
         self.current_system_prompt = ""
         self.current_data_context = ""
+        self.current_tables = [] # report tables the AI worker packs into the prompt
+
+        # Report data (SQL + pandas) is computed off the Tk thread, only drawing happens here.
+        # Each click gets a request id + cancel flag so a slower, older report never overwrites a newer one.
+        self.report_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="report")
+        self.report_request = 0
+        self.report_cancel = None
+        self.report_clicked_at = None
+        self.perf_panel = None
+
+        # Rendered canvases kept per report, revisiting one just swaps it back in
+        self.figure_cache = FigureCache(on_evict=lambda entry: entry['holder'].destroy())
         
         # Graph Description Mapping
         self.descriptions = {
@@ -73,6 +113,10 @@ class AnalyticsApp(ctk.CTk):
         self.canvas_frame = ctk.CTkFrame(self.graph_container, fg_color="#ffffff", corner_radius=8)
         self.canvas_frame.pack(expand=True, fill="both", padx=10, pady=10)
 
+        # Loading / error messages shown in place of the chart
+        self.canvas_status = ctk.CTkLabel(self.canvas_frame, text="", text_color="#2c3e50", font=("Inter", 14))
+        self.canvas_visible = None
+
         # RIGHT SIDE SIDEBAR
         self.side_panel = ctk.CTkFrame(self.content_frame, fg_color="transparent")
         self.side_panel.grid(row=0, column=1, sticky="nsew") 
@@ -109,7 +153,33 @@ class AnalyticsApp(ctk.CTk):
             height=45,
             font=("Inter", 14, "bold")
         )
-        self.ai_button.pack(pady=(5, 10), padx=15, fill="x")
+        self.ai_button.pack(pady=(5, 5), padx=15, fill="x")
+
+        # Same analysis again, skipping the on-disk response cache
+        self.regen_button = ctk.CTkButton(
+            self.ai_container,
+            text="Regenerate (ignore cached answer)",
+            command=lambda: self.run_ai_analysis(regenerate=True),
+            fg_color="transparent",
+            border_width=1,
+            border_color="#3e444c",
+            height=30,
+            font=("Inter", 12)
+        )
+        self.regen_button.pack(pady=(0, 5), padx=15, fill="x")
+
+        # Every report through the AI in one job, the button turns into "Cancel" while it runs
+        self.batch_button = ctk.CTkButton(
+            self.ai_container,
+            text="Analyse All Reports",
+            command=self.run_batch_analysis,
+            fg_color="transparent",
+            border_width=1,
+            border_color="#3e444c",
+            height=30,
+            font=("Inter", 12)
+        )
+        self.batch_button.pack(pady=(0, 10), padx=15, fill="x")
 
         # Disclaimer (RESTORED ORIGINAL TEXT)
         disclaimer_text = (
@@ -136,92 +206,331 @@ class AnalyticsApp(ctk.CTk):
         # BIND RESIZING EVENT
         self.ai_container.bind("<Configure>", self.adjust_disclaimer_wrap)
 
+        # Warm every report in idle time once the window is up
+        usage_path = self.db_manager.cache_dir / "report_usage.json" if self.db_manager.cache_dir else None
+        self.prefetcher = ReportPrefetcher(
+            {name: (lambda cancel, k=key: self.graph_lib.compute(k, cancel)) for name, key in self.reports.items()},
+            order=PREFETCH_ORDER,
+            workers=PREFETCH_WORKERS,
+            usage_path=usage_path
+        )
+        if self.data_loaded:
+            self.after_idle(self.prefetcher.start)
+
+        # Load the LLM after the window has been shown, the button follows its state
+        self.ai_analyst.add_listener(lambda state: self.after(0, self.update_ai_button))
+        self.after(500, self.ai_analyst.load_async)
+        self.protocol("WM_DELETE_WINDOW", self.on_close)
+
     def adjust_disclaimer_wrap(self, event):
         new_wrap_length = event.width - 40
         if new_wrap_length > 100:
             self.disclaimer_label.configure(wraplength=new_wrap_length)
 
+    def show_load_progress(self, label, fraction):
+        self.loading_label.configure(text=f"{label}... {fraction * 100:.0f}%")
+        self.update()
+
+    def on_close(self):
+        self.prefetcher.shutdown()
+        if self.batch_cancel is not None:
+            self.batch_cancel.set()
+        self.ai_analyst.shutdown()
+        if self.report_cancel is not None:
+            self.report_cancel.set()
+        self.report_executor.shutdown(wait=False, cancel_futures=True)
+        self.figure_cache.clear()
+        if perf.is_enabled() and self.db_manager.cache_dir:
+            # Started with ANALYTICS_PERF=1: the whole session ends up in one trace
+            count = perf.export_chrome_trace(self.db_manager.cache_dir / "perf_trace.json")
+            print(f"Performance trace ({count} events) saved to {self.db_manager.cache_dir / 'perf_trace.json'}")
+        self.destroy()
+
+    def show_in_canvas_frame(self, widget):
+        if self.canvas_visible is not None and self.canvas_visible is not widget:
+            self.canvas_visible.pack_forget()
+        widget.pack(expand=True, fill="both")
+        self.canvas_visible = widget
+
     def show_error(self, title, message):
         import tkinter.messagebox as msg
         msg.showerror(title, message)
 
     def setup_nav_buttons(self):
+        # Button name -> report key in graphs.py (compute_<key> / render_<key>)
         reports = [
-            ("Top Products", self.graph_lib.plot_top_products),
-            ("Severity Stack", self.graph_lib.plot_severity_stack),
-            ("Case Types", self.graph_lib.plot_case_types),
-            ("Global Hotspots", self.graph_lib.plot_global_hotspots),
-            ("Ticket Density", self.graph_lib.plot_ticket_density),
-            ("Industry Struggles", self.graph_lib.plot_industry_struggles),
-            ("Volume Trend", self.graph_lib.plot_volume_over_time),
-            ("Resolution Time", self.graph_lib.plot_resolution_time),
-            ("Backlog Growth", self.graph_lib.plot_backlog_growth),
+            ("Top Products", "top_products"),
+            ("Severity Stack", "severity_stack"),
+            ("Case Types", "case_types"),
+            ("Global Hotspots", "global_hotspots"),
+            ("Ticket Density", "ticket_density"),
+            ("Industry Struggles", "industry_struggles"),
+            ("Volume Trend", "volume_over_time"),
+            ("Resolution Time", "resolution_time"),
+            ("Backlog Growth", "backlog_growth"),
         ]
 
-        for i, (name, func) in enumerate(reports):
+        self.reports = dict(reports)
+
+        for i, (name, key) in enumerate(reports):
             btn = ctk.CTkButton(
                 self.button_container, 
                 text=name, 
-                command=lambda f=func, n=name: self.display_graph(f, n),
+                command=lambda k=key, n=name: self.display_graph(k, n),
                 width=130,
                 height=35,
                 corner_radius=6
             )
             btn.grid(row=0, column=i, padx=4, pady=10)
 
-    def display_graph(self, plot_func, report_name):
-        for widget in self.canvas_frame.winfo_children():
-            widget.destroy()
+        # Span timings and cache stats (perf.py)
+        ctk.CTkButton(
+            self.button_container,
+            text="Performance",
+            command=self.show_perf_panel,
+            width=100,
+            height=35,
+            corner_radius=6,
+            fg_color="transparent",
+            border_width=1,
+            border_color="#3e444c"
+        ).grid(row=0, column=len(reports), padx=(16, 4), pady=10)
+
+    def show_perf_panel(self):
+        if self.perf_panel is not None and self.perf_panel.winfo_exists():
+            self.perf_panel.focus()
+            return
+        self.perf_panel = PerfPanel(self)
+
+    def display_graph(self, report_key, report_name):
+        # The user wants something now: drop queued warm-ups, pick them up again when idle
+        self.prefetcher.pause()
+        self.prefetcher.record_use(report_name)
+
+        # Abandon whatever the previous click was still computing
+        if self.report_cancel is not None:
+            self.report_cancel.set()
+        self.report_cancel = threading.Event()
+        self.report_request += 1
+        request_id = self.report_request
+        self.report_clicked_at = time.perf_counter()
 
         self.graph_label.configure(text=report_name)
         desc = self.descriptions.get(report_name, "No description available.")
         self.info_text.configure(text=desc)
 
-        # Reset AI Box
-        self.ai_textbox.configure(state="normal") 
-        self.ai_textbox.delete("0.0", "end")
-        self.ai_textbox.insert("0.0", "Ready for analysis...")
-        self.ai_textbox.configure(state="disabled") 
-        
-        fig, ax = plt.subplots(figsize=(9, 6), dpi=100)
-        self.current_system_prompt, self.current_data_context = plot_func(ax)
-        fig.tight_layout()
+        # The analysis of the previous report is cancelled in the AI worker
+        if self.ai_job is not None:
+            self.ai_job.cancel()
+            self.ai_job = None
+            self._ai_complete()
+
+        # Reset AI Box. A running all-reports analysis keeps the box, it isn't tied to the report on screen.
+        if self.batch_cancel is None or self.ai_request != self.batch_request:
+            self.ai_request += 1
+            self.ai_textbox.configure(state="normal") 
+            self.ai_textbox.delete("0.0", "end")
+            self.ai_textbox.insert("0.0", "Ready for analysis...")
+            self.ai_textbox.configure(state="disabled") 
+
+        # Already rendered before: just swap the canvas back in
+        cached = self.figure_cache.get(report_key)
+        if cached is not None:
+            self.show_in_canvas_frame(cached['holder'])
+            self.current_system_prompt, self.current_data_context, self.current_tables = cached['prompts']
+            self.after_idle(self.prefetcher.resume)
+            return
+
+        # The AI must not analyze the previous report's context while this one loads
+        self.current_system_prompt = ""
+        self.current_data_context = ""
+        self.current_tables = []
+
+        self.canvas_status.configure(text="Crunching the numbers...", text_color="#2c3e50")
+        self.show_in_canvas_frame(self.canvas_status)
+
+        # Data step on a worker thread, drawing comes back to the main thread
+        future = self.report_executor.submit(self.graph_lib.compute, report_key, self.report_cancel)
+        future.add_done_callback(lambda f: self.after(0, self._report_ready, f, request_id, report_key))
+
+    def _report_ready(self, future, request_id, report_key):
+        # Main thread. Results of an older click are simply dropped.
+        if request_id != self.report_request or future.cancelled():
+            return
+
+        error = future.exception()
+        if isinstance(error, ReportCancelled):
+            return
+
+        if error is not None:
+            print(f"Report Error ({report_key}): {error}")
+            self.canvas_status.configure(text=f"Could not build this report:\n{error}", text_color="#c0392b")
+            self.show_in_canvas_frame(self.canvas_status)
+            self.after_idle(self.prefetcher.resume)
+            return
+
+        data = future.result()
+        with perf.span("ui.figure", report=report_key):
+            fig, ax = plt.subplots(figsize=(9, 6), dpi=100)
+            self.current_system_prompt, self.current_data_context = self.graph_lib.render(report_key, ax, data)
+            self.current_tables = data.get('tables', [])
+            fig.tight_layout()
         
-        canvas = FigureCanvasTkAgg(fig, master=self.canvas_frame)
-        canvas.draw()
-        NavigationToolbar2Tk(canvas, self.canvas_frame).update()
-        canvas.get_tk_widget().pack(expand=True, fill="both")
+        # Canvas + toolbar live in their own frame so the pair can be hidden and cached as one
+        with perf.span("ui.canvas_create", report=report_key):
+            holder = ctk.CTkFrame(self.canvas_frame, fg_color="transparent")
+            canvas = FigureCanvasTkAgg(fig, master=holder)
+            with perf.span("ui.matplotlib_draw", report=report_key):
+                canvas.draw()
+            NavigationToolbar2Tk(canvas, holder).update()
+            canvas.get_tk_widget().pack(expand=True, fill="both")
         plt.close(fig)
+
+        self.show_in_canvas_frame(holder)
+        self.figure_cache.put(
+            report_key,
+            {'holder': holder, 'prompts': (self.current_system_prompt, self.current_data_context, self.current_tables)},
+            canvas_bytes(*canvas.get_width_height())
+        )
+        # Matplotlib only re-renders the canvas that is on screen when the window is resized
+        # (hidden ones catch up when shown again), we just keep the memory estimate in sync
+        canvas.get_tk_widget().bind(
+            "<Configure>",
+            lambda e, k=report_key: self.figure_cache.resize(k, canvas_bytes(e.width, e.height)),
+            add="+"
+        )
+
+        perf.record("ui.click_to_chart", self.report_clicked_at, time.perf_counter(), report=report_key)
+        self.after_idle(self.prefetcher.resume)
         
-    # --- THREADING LOGIC ---
-    def run_ai_analysis(self):
+    # --- AI REQUESTS ---
+    def run_ai_analysis(self, regenerate=False):
         if not self.current_data_context:
             return
             
         # 1. Update UI to "Loading" state
+        if self.ai_analyst.state == STATE_LOADING:
+            # The request is queued in the AI worker and starts on its own
+            message = "Waiting for the AI model to finish loading... the analysis will start automatically."
+        else:
+            message = "Analyst is thinking... (This may take a moment)"
         self.ai_textbox.configure(state="normal")
         self.ai_textbox.delete("0.0", "end")
-        self.ai_textbox.insert("0.0", "Analyst is thinking... (This may take a moment)")
+        self.ai_textbox.insert("0.0", message)
         self.ai_textbox.configure(state="disabled")
-        self.ai_button.configure(state="disabled", text="Analyzing...")
+        self.ai_busy = True
+        self.update_ai_button()
+
+        # 2. Queue it in the AI worker process and poll for tokens from the Tk loop (no thread per click)
+        self.ai_request += 1
+        self.ai_job = self.ai_analyst.submit(self.current_system_prompt, self.current_data_context, regenerate, tables=self.current_tables)
+        self.after(AI_STREAM_FLUSH_MS, self._poll_ai_job, self.ai_job, self.ai_request, True)
+
+    def _poll_ai_job(self, job, request_id, first):
+        if job is not self.ai_job:
+            return # cancelled by a report switch
+        text, done = job.drain()
+        if text or (done and first):
+            self._ai_append(request_id, text, first)
+            first = False
+        if done:
+            self.ai_job = None
+            self._ai_complete()
+        else:
+            self.after(AI_STREAM_FLUSH_MS, self._poll_ai_job, job, request_id, first)
 
-        # 2. Start Thread
-        thread = threading.Thread(target=self._ai_worker, daemon=True)
+    def run_batch_analysis(self):
+        # Second click while running = cancel
+        if self.batch_cancel is not None:
+            self.batch_cancel.set()
+            self.batch_button.configure(state="disabled", text="Cancelling...")
+            return
+        if not self.data_loaded:
+            return
+
+        self.batch_cancel = threading.Event()
+        self.batch_progress = ""
+        self.ai_request += 1
+        self.batch_request = self.ai_request
+        self.ai_textbox.configure(state="normal")
+        self.ai_textbox.delete("0.0", "end")
+        self.ai_textbox.insert("0.0", "Preparing all reports for the analyst...")
+        self.ai_textbox.configure(state="disabled")
+        self.update_ai_button()
+
+        thread = threading.Thread(
+            target=self._batch_worker,
+            args=(self.ai_request, self.batch_cancel),
+            daemon=True
+        )
         thread.start()
 
-    def _ai_worker(self):
-        # Background thread
-        response = self.ai_analyst.analyze(self.current_system_prompt, self.current_data_context)
-        # Schedule update on main thread
-        self.after(0, self._ai_complete, response)
+    def _batch_worker(self, request_id, cancel):
+        batch = BatchAnalysis(self.graph_lib, self.ai_analyst, self.reports)
+        progress = lambda done, total, name: self.after(0, self._batch_progress, done, total)
+        self._stream_to_textbox(request_id, batch.run(cancel, progress))
+        if batch.sections and self.db_manager.cache_dir:
+            batch.save(self.db_manager.cache_dir / "ai_all_reports.md")
+        self.after(0, self._batch_complete)
 
-    def _ai_complete(self, response):
+    def _batch_progress(self, done, total):
+        self.batch_progress = f" ({done}/{total})"
+        self.update_ai_button()
+
+    def _batch_complete(self):
+        self.batch_cancel = None
+        self.batch_request = None
+        self.update_ai_button()
+
+    def _stream_to_textbox(self, request_id, stream):
+        # Batch thread: tokens are batched so Tk gets one update per AI_STREAM_FLUSH_S, not per token
+        pending = []
+        last_flush = time.perf_counter()
+        first = True
+        for piece in stream:
+            pending.append(piece)
+            now = time.perf_counter()
+            if now - last_flush >= AI_STREAM_FLUSH_S:
+                # Schedule update on main thread
+                self.after(0, self._ai_append, request_id, "".join(pending), first)
+                pending = []
+                first = False
+                last_flush = now
+        if pending or first:
+            self.after(0, self._ai_append, request_id, "".join(pending), first)
+
+    def _ai_append(self, request_id, text, replace):
         # Main thread UI update
+        if request_id != self.ai_request:
+            return
         self.ai_textbox.configure(state="normal")
-        self.ai_textbox.delete("0.0", "end")
-        self.ai_textbox.insert("0.0", response)
+        if replace:
+            self.ai_textbox.delete("0.0", "end")
+        self.ai_textbox.insert("end", text)
+        self.ai_textbox.see("end")
         self.ai_textbox.configure(state="disabled")
-        self.ai_button.configure(state="normal", text="Generate Deep Analysis")
+
+    def _ai_complete(self):
+        self.ai_busy = False
+        self.update_ai_button()
+
+    def update_ai_button(self):
+        state = self.ai_analyst.state
+        self.regen_button.configure(state="disabled" if self.ai_busy else "normal")
+        # A single analysis can run while the batch does (it gets priority in the worker)
+        if self.batch_cancel is not None:
+            if not self.batch_cancel.is_set():
+                self.batch_button.configure(state="normal", text=f"Cancel All-Reports Analysis{self.batch_progress}")
+        else:
+            self.batch_button.configure(state="normal", text="Analyse All Reports")
+        if self.ai_busy:
+            self.ai_button.configure(state="disabled", text="Analyzing...")
+        elif state == STATE_LOADING:
+            self.ai_button.configure(state="normal", text="Generate Deep Analysis (AI loading...)")
+        elif state == STATE_FAILED:
+            self.ai_button.configure(state="normal", text="Generate Deep Analysis (AI unavailable)")
+        else:
+            self.ai_button.configure(state="normal", text="Generate Deep Analysis")
 
 if __name__ == "__main__":
     app = AnalyticsApp()
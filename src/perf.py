@@ -0,0 +1,177 @@
+# Lightweight timing spans for the hot paths (JSON parse, inserts, SQL, pandas, drawing, the AI model).
+# Recording is off by default; span() then hands back one shared do-nothing object, so the cost in
+# the code paths is a function call and an if. Turn it on with ANALYTICS_PERF=1 or from the
+# dashboard's performance panel (main.py).
+#
+#   with perf.span("sql", query=sql):
+#       ...
+#
+# Spans nest per thread: each one also knows its self time (its duration minus the spans inside it),
+# e.g. the self time of "report.compute" is the pandas work around the SQL queries.
+# export_chrome_trace() writes the Chrome trace format, open it in chrome://tracing or https://ui.perfetto.dev
+
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+MAX_SPANS = 100_000
+
+_enabled = os.environ.get("ANALYTICS_PERF", "").lower() in ("1", "true", "yes")
+_spans = deque(maxlen=MAX_SPANS) # (name, start_ns, dur_ns, self_ns, tid, args), oldest dropped first
+_lock = threading.Lock()
+_local = threading.local()
+_origin_ns = time.perf_counter_ns()
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def set(self, **args):
+        pass
+
+
+_NULL = _NullSpan()
+
+
+class Span:
+    __slots__ = ("name", "args", "start_ns", "child_ns")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+        self.child_ns = 0
+
+    def __enter__(self):
+        stack = getattr(_local, "stack", None)
+        if stack is None:
+            stack = _local.stack = []
+        stack.append(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        dur_ns = time.perf_counter_ns() - self.start_ns
+        stack = _local.stack
+        stack.pop()
+        if stack:
+            stack[-1].child_ns += dur_ns
+        _add(self.name, self.start_ns, dur_ns, dur_ns - self.child_ns, self.args)
+        return False
+
+    def set(self, **args):
+        # Extra details only known at the end (row counts, cache hit...)
+        self.args.update(args)
+
+
+def span(name, **args):
+    if not _enabled:
+        return _NULL
+    return Span(name, args)
+
+
+def traced(name):
+    """Decorator version of span() for whole functions."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with Span(name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record(name, start_s, end_s, tid=None, **args):
+    """
+    Adds a span timed elsewhere, start/end in perf_counter() seconds.
+    tid: track to show it on, e.g. the AI worker's pid (default: the calling thread).
+    """
+    if not _enabled:
+        return
+    start_ns = int(start_s * 1e9)
+    dur_ns = max(int((end_s - start_s) * 1e9), 0)
+    _add(name, start_ns, dur_ns, dur_ns, args, tid)
+
+
+def _add(name, start_ns, dur_ns, self_ns, args, tid=None):
+    with _lock:
+        _spans.append((name, start_ns, dur_ns, self_ns, tid or threading.get_ident(), args))
+
+
+def enable(on=True):
+    global _enabled
+    _enabled = on
+
+
+def is_enabled():
+    return _enabled
+
+
+def clear():
+    with _lock:
+        _spans.clear()
+
+
+def spans():
+    with _lock:
+        return list(_spans)
+
+
+def stats():
+    """Per span name: count, total_ms, self_ms, mean_ms, max_ms, last_ms. Sorted by total time."""
+    table = {}
+    for name, _, dur_ns, self_ns, _, _ in spans():
+        row = table.setdefault(name, {"count": 0, "total_ms": 0.0, "self_ms": 0.0, "max_ms": 0.0, "last_ms": 0.0})
+        dur_ms = dur_ns / 1e6
+        row["count"] += 1
+        row["total_ms"] += dur_ms
+        row["self_ms"] += self_ns / 1e6
+        row["max_ms"] = max(row["max_ms"], dur_ms)
+        row["last_ms"] = dur_ms
+    for row in table.values():
+        row["mean_ms"] = row["total_ms"] / row["count"]
+    return dict(sorted(table.items(), key=lambda item: -item[1]["total_ms"]))
+
+
+def format_stats(limit=None):
+    rows = list(stats().items())[:limit]
+    if not rows:
+        return "No spans recorded yet." if _enabled else "Recording is off."
+    lines = [f"{'span':<24}{'count':>7}{'total ms':>11}{'self ms':>10}{'mean ms':>10}{'max ms':>10}{'last ms':>10}"]
+    for name, row in rows:
+        lines.append(f"{name[:23]:<24}{row['count']:>7}{row['total_ms']:>11.1f}{row['self_ms']:>10.1f}"
+                     f"{row['mean_ms']:>10.2f}{row['max_ms']:>10.1f}{row['last_ms']:>10.1f}")
+    return "\n".join(lines)
+
+
+def _short(value, limit=120):
+    # SQL and the like are passed as is (nothing is formatted while recording), squeezed here
+    text = " ".join(str(value).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+def export_chrome_trace(path):
+    events = [{
+        "name": name,
+        "cat": name.split(".")[0],
+        "ph": "X",
+        "ts": (start_ns - _origin_ns) / 1000,
+        "dur": dur_ns / 1000,
+        "pid": os.getpid(),
+        "tid": tid,
+        "args": {**{k: _short(v) for k, v in args.items()}, "self_ms": round(self_ns / 1e6, 3)},
+    } for name, start_ns, dur_ns, self_ns, tid, args in spans()]
+    # Readable thread names in the viewer
+    for thread in threading.enumerate():
+        events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": thread.ident, "args": {"name": thread.name}})
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+    return len(events)
@@ -0,0 +1,88 @@
+# Live performance panel of the dashboard: the span stats from perf.py plus the caches and the
+# last AI request, refreshed every second while the window is open.
+
+import time
+from pathlib import Path
+
+import customtkinter as ctk
+
+import perf
+
+REFRESH_MS = 1000
+# Used when the data isn't cached on disk (non-persistent DataManager)
+TRACE_DIR = Path(__file__).resolve().parent.parent / "cache"
+
+
+def format_bytes(n):
+    return f"{n / 1024 ** 2:.1f} MB"
+
+
+class PerfPanel(ctk.CTkToplevel):
+    def __init__(self, app):
+        super().__init__(app)
+        self.app = app
+        self.title("Performance")
+        self.geometry("820x560")
+
+        top = ctk.CTkFrame(self, fg_color="transparent")
+        top.pack(fill="x", padx=10, pady=(10, 0))
+
+        self.record_var = ctk.BooleanVar(value=perf.is_enabled())
+        ctk.CTkCheckBox(top, text="Record spans", variable=self.record_var, command=self.toggle_recording).pack(side="left")
+        ctk.CTkButton(top, text="Export Chrome trace", width=160, command=self.export_trace).pack(side="right")
+        ctk.CTkButton(top, text="Reset", width=80, command=perf.clear).pack(side="right", padx=(0, 8))
+
+        self.status = ctk.CTkLabel(self, text="", font=("Inter", 12), text_color="#95a5a6", anchor="w")
+        self.status.pack(fill="x", padx=12)
+
+        self.textbox = ctk.CTkTextbox(self, font=("Courier", 12), wrap="none")
+        self.textbox.pack(expand=True, fill="both", padx=10, pady=10)
+
+        self.refresh()
+
+    def toggle_recording(self):
+        perf.enable(self.record_var.get())
+        if self.record_var.get():
+            # Data loading happens before the window exists, start with ANALYTICS_PERF=1 to see it
+            self.status.configure(text="Recording. Click through the reports / run the AI to collect spans.")
+
+    def export_trace(self):
+        trace_dir = self.app.db_manager.cache_dir or TRACE_DIR
+        trace_dir.mkdir(parents=True, exist_ok=True)
+        path = trace_dir / f"perf_trace_{time.strftime('%Y%m%d_%H%M%S')}.json"
+        try:
+            count = perf.export_chrome_trace(path)
+        except OSError as e:
+            self.status.configure(text=f"Could not write the trace: {e}")
+            return
+        self.status.configure(text=f"{count} events written to {path} (open in chrome://tracing or ui.perfetto.dev)")
+
+    def refresh(self):
+        if not self.winfo_exists():
+            return
+        lines = [perf.format_stats(), ""]
+
+        lines.append(f"Query backend: {self.app.db_manager.backend.name}")
+        query = self.app.db_manager.query_cache_stats()
+        if query:
+            lines.append(f"Query cache:  {query['entries']} entries, {format_bytes(query['bytes'])} of {format_bytes(query['max_bytes'])}, "
+                         f"hit rate {query['hit_rate']:.0%}, {query['evictions']} evictions")
+        figures = self.app.figure_cache.stats()
+        lines.append(f"Figure cache: {figures['entries']} canvases, {format_bytes(figures['bytes'])} of {format_bytes(figures['max_bytes'])}, "
+                     f"{figures['hits']} hits / {figures['misses']} misses")
+
+        ai = self.app.ai_analyst
+        lines.append(f"AI model:     {ai.state}, {ai.restarts} worker restarts")
+        stats = ai.last_stats
+        if stats and not stats.get("cached") and stats.get("ttft_s") is not None:
+            speed = f"{stats['tokens_per_s']:.1f} tok/s" if stats.get("tokens_per_s") else "n/a"
+            lines.append(f"Last answer:  {stats.get('prompt_tokens')} prompt tokens, first token after {stats['ttft_s']:.2f}s "
+                         f"(prefix {stats.get('prefix') or 'not reused'}), {stats.get('tokens')} tokens at {speed}")
+        elif stats and stats.get("cached"):
+            lines.append("Last answer:  served from the response cache")
+
+        self.textbox.configure(state="normal")
+        self.textbox.delete("0.0", "end")
+        self.textbox.insert("0.0", "\n".join(lines))
+        self.textbox.configure(state="disabled")
+        self.after(REFRESH_MS, self.refresh)
@@ -0,0 +1,110 @@
+# Warms the reports in the background once the data is loaded, so the first click on each one
+# hits the query cache instead of SQLite. Runs on a small thread pool and never touches Tk.
+#
+# Order: reports the user opens the most go first (counts are kept in a small JSON file),
+# ties follow the configured order. Whenever the user asks for a report the pending work is
+# dropped and a warm-up already running stops at its next checkpoint (pause); both are picked
+# up again once the UI is idle (resume).
+
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from graphs import ReportCancelled
+
+
+class ReportPrefetcher:
+    def __init__(self, reports, order=None, workers=2, usage_path=None):
+        """
+        reports: dict name -> callable(cancel) that computes the report's data; it raises
+                 ReportCancelled once the threading.Event `cancel` is set.
+        order: report names in the preferred warm-up order, defaults to the dict order.
+        usage_path: optional JSON file where per-report open counts are kept between runs.
+        """
+        self.reports = reports
+        self.order = [n for n in (order or reports) if n in reports]
+        self.workers = max(1, workers)
+        self.usage_path = usage_path
+        self.usage = self._load_usage()
+
+        self.executor = None
+        self.futures = {} # name -> (future, cancel event of the run it belongs to)
+        self.warmed = set()
+        self.lock = threading.Lock()
+        self.paused = threading.Event()
+        # Set by pause(): stops the warm-ups of this run, even the ones already computing
+        self.cancel = threading.Event()
+
+    def queue_order(self):
+        rank = {name: i for i, name in enumerate(self.order)}
+        return sorted(self.order, key=lambda n: (-self.usage.get(n, 0), rank[n]))
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="prefetch")
+        self.paused.clear()
+
+        with self.lock:
+            if self.cancel.is_set():
+                self.cancel = threading.Event()
+            for name in self.queue_order():
+                # A warm-up of a cancelled run may still be winding down, it doesn't count
+                if name in self.warmed or (name in self.futures and self.futures[name][1] is self.cancel):
+                    continue
+                self.futures[name] = (self.executor.submit(self._warm, name, self.cancel), self.cancel)
+
+    def pause(self):
+        # Pending reports are cancelled right away, running ones stop at their next checkpoint
+        # (the queries they already finished stay in the cache), so the user's report gets the database.
+        self.paused.set()
+        with self.lock:
+            self.cancel.set()
+            for name, (future, _) in list(self.futures.items()):
+                if future.cancel():
+                    del self.futures[name]
+
+    def resume(self):
+        if self.executor is not None:
+            self.start()
+
+    def shutdown(self):
+        self.pause()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    def record_use(self, name):
+        self.usage[name] = self.usage.get(name, 0) + 1
+        self.warmed.add(name)
+        self._save_usage()
+
+    def _warm(self, name, cancel):
+        try:
+            if not cancel.is_set():
+                self.reports[name](cancel)
+                self.warmed.add(name)
+        except ReportCancelled:
+            pass # paused, warmed again on resume
+        except Exception as e:
+            print(f"Prefetch of '{name}' failed: {e}")
+        finally:
+            with self.lock:
+                if name in self.futures and self.futures[name][1] is cancel:
+                    del self.futures[name]
+
+    def _load_usage(self):
+        if not self.usage_path or not self.usage_path.exists():
+            return {}
+        try:
+            return json.loads(self.usage_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    def _save_usage(self):
+        if not self.usage_path:
+            return
+        try:
+            self.usage_path.parent.mkdir(parents=True, exist_ok=True)
+            self.usage_path.write_text(json.dumps(self.usage, indent=2))
+        except OSError as e:
+            print(f"Could not save report usage: {e}")
@@ -0,0 +1,122 @@
+# Fits as much report data as possible into the model's context window.
+# Every report hands over its aggregated tables (rows already in priority order). They are written
+# as compact pipe-separated text and added row by row until the token budget is used up, measured
+# with the model's own tokenizer. Enough room is always left for the answer, and the answer's
+# max_tokens is whatever is left of the context after the prompt.
+
+import numpy as np
+import pandas as pd
+
+# Room always kept for the answer ("under 300 words" is ~400 tokens)
+MIN_ANSWER_TOKENS = 400
+# The old fixed answer size stays the upper limit
+MAX_ANSWER_TOKENS = 900
+# Margin for tokenizer differences between the pieces and the final prompt
+SAFETY_TOKENS = 16
+# Bump when the packing rules change: cached answers were written for prompts packed the old way
+PACKING_VERSION = 1
+
+
+def format_value(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return ""
+    if isinstance(value, (pd.Timestamp, np.datetime64)):
+        return pd.Timestamp(value).strftime("%Y-%m-%d")
+    if isinstance(value, (float, np.floating)):
+        if float(value).is_integer():
+            return str(int(value))
+        return f"{value:.2f}".rstrip("0").rstrip(".")
+    return str(value)
+
+
+def table_payload(title, df, columns=None):
+    """DataFrame -> plain dict of strings (cheap to send to the AI worker and to hash for the response cache)."""
+    if columns is not None:
+        df = df[columns]
+    return {
+        "title": title,
+        "columns": [str(c) for c in df.columns],
+        "rows": [[format_value(v) for v in row] for row in df.itertuples(index=False)],
+    }
+
+
+class PromptBuilder:
+    def __init__(self, count_tokens, n_ctx, template, max_answer_tokens=MAX_ANSWER_TOKENS, min_answer_tokens=MIN_ANSWER_TOKENS):
+        """
+        count_tokens(text) -> number of tokens of the full text (BOS included), from the model's tokenizer.
+        template(system_instructions, data_context, tables_text) -> prompt (ai_engine.build_prompt).
+        """
+        self.count_tokens = count_tokens
+        self.n_ctx = n_ctx
+        self.template = template
+        self.max_answer_tokens = max_answer_tokens
+        self.min_answer_tokens = min(min_answer_tokens, max_answer_tokens)
+
+    def build(self, system_instructions, data_context, tables=None):
+        """
+        Returns (prompt, max_tokens, info).
+        info: prompt_tokens, rows_packed, rows_total.
+        """
+        tables = tables or []
+        limit = self.n_ctx - self.min_answer_tokens - SAFETY_TOKENS
+
+        base_tokens = self.count_tokens(self.template(system_instructions, data_context, ""))
+        budget = limit - base_tokens
+
+        # Tables in the given order, rows until the budget runs out (per-line counts are close to the
+        # real cost since every row sits on its own line, the final check below settles the rest)
+        blocks = []
+        used = 0
+        for table in tables:
+            if not table["rows"]:
+                continue
+            header = f"[{table['title']}]\n{'|'.join(table['columns'])}\n"
+            cost = self._count_piece(header)
+            if used + cost > budget:
+                break
+            lines = []
+            for row in table["rows"]:
+                line = "|".join(row) + "\n"
+                cost_line = self._count_piece(line)
+                if used + cost + cost_line > budget:
+                    break
+                lines.append(line)
+                cost += cost_line
+            if not lines:
+                break
+            blocks.append([header, lines, len(table["rows"])])
+            used += cost
+            if len(lines) < len(table["rows"]):
+                break # this table was cut, the ones after it are less important
+
+        # Exact count of the whole thing, dropping rows from the end until it fits for sure
+        while True:
+            prompt = self.template(system_instructions, data_context, self._render(blocks))
+            prompt_tokens = self.count_tokens(prompt)
+            if prompt_tokens <= limit or not blocks:
+                break
+            blocks[-1][1].pop()
+            if not blocks[-1][1]:
+                blocks.pop()
+
+        max_tokens = max(1, min(self.max_answer_tokens, self.n_ctx - prompt_tokens - SAFETY_TOKENS))
+        info = {
+            "prompt_tokens": prompt_tokens,
+            "rows_packed": sum(len(lines) for _, lines, _ in blocks),
+            "rows_total": sum(len(t["rows"]) for t in tables),
+        }
+        return prompt, max_tokens, info
+
+    def _count_piece(self, text):
+        # count_tokens includes BOS, one token less for a piece in the middle of the prompt
+        return max(1, self.count_tokens(text) - 1)
+
+    @staticmethod
+    def _render(blocks):
+        parts = []
+        for header, lines, total in blocks:
+            parts.append(header)
+            parts.extend(lines)
+            if len(lines) < total:
+                parts.append(f"({total - len(lines)} more rows not shown)\n")
+        return "".join(parts)
@@ -0,0 +1,125 @@
+# Where DataManager.get_query runs the report SQL.
+#   sqlite - the database load_data builds (default)
+#   duckdb - an in-process columnar engine (vectorised, multi-threaded, no server) running the same SQL.
+#            Each SQLite table is copied into it the first time a query reads it, so the small agg_*
+#            tables the reports use come over instantly and the raw cases only when something scans them.
+#            Needs `pip install duckdb`, without it DataManager stays on SQLite.
+# Pick one with DataManager(backend=...) or the environment variable ANALYTICS_BACKEND=sqlite|duckdb.
+# Results come back with the dtypes pd.read_sql gives for SQLite, so the reports can't tell the difference
+# (bench_backends.py parity and tests/test_backend_parity.py check that for all nine reports).
+
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+BACKENDS = ("sqlite", "duckdb")
+DEFAULT_BACKEND = os.environ.get("ANALYTICS_BACKEND", "sqlite").strip().lower() or "sqlite"
+COPY_CHUNK_ROWS = 250_000
+
+# SQLite declared type -> DuckDB column type. Columns without one (extra JSON keys) are kept as text.
+DUCKDB_TYPES = {"INTEGER": "BIGINT", "REAL": "DOUBLE", "FLOAT": "DOUBLE", "TEXT": "VARCHAR"}
+# DuckDB result types that pd.read_sql on SQLite would return as int64 / float64
+WIDE_INTEGERS = ("HUGEINT", "UHUGEINT", "UBIGINT")
+TABLE_REFERENCE = re.compile(r'\b(?:FROM|JOIN)\s+"?(\w+)', re.IGNORECASE)
+
+
+def available(name):
+    if name == "sqlite":
+        return True
+    if name == "duckdb":
+        return duckdb is not None
+    return False
+
+
+def sqlite_tables(conn):
+    # Everything load_data builds; the _cache_info / _source_files bookkeeping stays out
+    return [name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite%' ORDER BY name")
+        if not name.startswith("_")]
+
+
+class SQLiteBackend:
+    name = "sqlite"
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def query(self, sql, params=None):
+        return pd.read_sql(sql, self.conn, params=params)
+
+    def close(self):
+        pass
+
+
+class DuckDBBackend:
+    name = "duckdb"
+
+    def __init__(self, conn, tables=None):
+        """Serves the tables of the SQLite connection `conn` (default: all of them) from an in-memory DuckDB."""
+        self.conn = conn
+        self.db = duckdb.connect(":memory:")
+        self.pending = set(tables or sqlite_tables(conn))
+
+    def _copy_tables(self, sql):
+        # Tables the query reads (FROM / JOIN) that aren't copied yet
+        for table in sorted(self.pending & set(TABLE_REFERENCE.findall(sql))):
+            start = time.perf_counter()
+            rows = self._copy(self.conn, table)
+            self.pending.discard(table)
+            print(f"DuckDB backend: copied '{table}' ({rows} rows) in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+    def _copy(self, conn, table):
+        columns = [(name, (decl or "").upper()) for _, name, decl, *_ in conn.execute(f'PRAGMA table_info("{table}")')]
+        types = {name: DUCKDB_TYPES.get(decl.split("(")[0].strip(), "VARCHAR") for name, decl in columns}
+        cols_sql = ", ".join(f'"{c}" {t}' for c, t in types.items())
+        self.db.execute(f'CREATE TABLE "{table}" ({cols_sql})')
+
+        rows = 0
+        for chunk in pd.read_sql(f'SELECT * FROM "{table}"', conn, chunksize=COPY_CHUNK_ROWS):
+            for column, kind in types.items():
+                if kind == "VARCHAR" and not pd.api.types.is_string_dtype(chunk[column]):
+                    # Untyped SQLite columns can mix numbers and text
+                    chunk[column] = chunk[column].map(lambda v: None if v is None or v != v else str(v))
+            self.db.register("_chunk", chunk)
+            self.db.execute(f'INSERT INTO "{table}" SELECT * FROM _chunk')
+            self.db.unregister("_chunk")
+            rows += len(chunk)
+        return rows
+
+    def query(self, sql, params=None):
+        if self.pending:
+            self._copy_tables(sql)
+        result = self.db.execute(sql, params or [])
+        kinds = [str(kind).upper() for _, kind, *_ in result.description]
+        df = result.df()
+        for column, kind in zip(df.columns, kinds):
+            if kind in WIDE_INTEGERS or kind.startswith("DECIMAL"):
+                # SUM() over BIGINT is HUGEINT here, an integer in SQLite
+                values = df[column]
+                whole = values.notna().all() and kind in WIDE_INTEGERS
+                df[column] = values.astype(np.int64) if whole else values.astype(np.float64)
+        return df
+
+    def close(self):
+        self.db.close()
+
+
+def open_backend(name, conn):
+    """Backend `name` over the loaded SQLite connection, SQLite when it isn't available."""
+    if name not in BACKENDS:
+        print(f"Unknown query backend '{name}', using sqlite.")
+        name = "sqlite"
+    if not available(name):
+        print(f"Query backend '{name}' is not installed (pip install {name}), using sqlite.")
+        name = "sqlite"
+    if name == "duckdb":
+        return DuckDBBackend(conn)
+    return SQLiteBackend(conn)
@@ -0,0 +1,85 @@
+# Result cache for DataManager.get_query.
+# The tables are static once loaded, so the same SQL always gives the same DataFrame.
+# Entries are evicted least-recently-used first once their total memory passes max_bytes.
+
+import re
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def normalize_sql(sql):
+    # Collapse whitespace so formatting differences don't create separate entries.
+    # Text inside single-quoted literals is left untouched.
+    parts = sql.strip().split("'")
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", " ", parts[i])
+    return "'".join(parts)
+
+
+def make_key(sql, params=None):
+    if params is None:
+        frozen = None
+    elif isinstance(params, dict):
+        frozen = tuple(sorted(params.items()))
+    else:
+        frozen = tuple(params)
+    return normalize_sql(sql), frozen
+
+
+class QueryCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (DataFrame, bytes)
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        # Callers modify the frames they get back (set_index, new columns...), so hand out copies
+        return entry[0].copy()
+
+    def put(self, key, df):
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+
+        stored = df.copy()
+        with self.lock:
+            if key in self.entries:
+                self.current_bytes -= self.entries.pop(key)[1]
+            self.entries[key] = (stored, size)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self.entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
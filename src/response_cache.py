@@ -0,0 +1,80 @@
+# On-disk cache of finished AI analyses.
+# A report's prompt is deterministic for a given dataset, so the same prompt + model file + sampling
+# parameters can be answered from disk instead of running CPU inference again (also across restarts).
+# One small JSON file per entry; oldest-used files are deleted once the folder passes max_bytes.
+
+import hashlib
+import json
+import time
+from pathlib import Path
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+HASH_CHUNK_BYTES = 4 * 1024 * 1024
+
+
+def make_key(prompt, model_identity, params):
+    payload = json.dumps({"prompt": prompt, "model": model_identity, "params": params}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        path = self.directory / f"{key}.json"
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            path.touch() # mtime doubles as "last used" for eviction
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["response"]
+
+    def put(self, key, response, meta=None):
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            entry = {"response": response, "created": time.time(), **(meta or {})}
+            (self.directory / f"{key}.json").write_text(json.dumps(entry), encoding="utf-8")
+            self._evict()
+        except OSError as e:
+            print(f"Could not write AI response cache: {e}")
+
+    def _evict(self):
+        files = sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime)
+        files = [p for p in files if p.name != "model_hashes.json"]
+        total = sum(p.stat().st_size for p in files)
+        for path in files:
+            if total <= self.max_bytes:
+                break
+            total -= path.stat().st_size
+            path.unlink(missing_ok=True)
+
+    def model_identity(self, model_path):
+        # Hashing a multi-GB GGUF takes a while, so the digest is remembered per (size, mtime)
+        st = model_path.stat()
+        index_path = self.directory / "model_hashes.json"
+        try:
+            known = json.loads(index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            known = {}
+
+        entry = known.get(str(model_path))
+        if not entry or entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+            digest = hashlib.sha256()
+            with open(model_path, "rb") as f:
+                while chunk := f.read(HASH_CHUNK_BYTES):
+                    digest.update(chunk)
+            entry = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": digest.hexdigest()}
+            known[str(model_path)] = entry
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                index_path.write_text(json.dumps(known, indent=2), encoding="utf-8")
+            except OSError as e:
+                print(f"Could not save model hash: {e}")
+
+        return f"{model_path.name}:{entry['sha256']}"
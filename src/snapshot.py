@@ -0,0 +1,157 @@
+# Columnar snapshot of the source data (Arrow IPC files, needs pyarrow).
+# The JSON is parsed once; the snapshot keeps the parsed rows with real types: timestamps instead of
+# date strings, and the repetitive text columns (products, severities, countries, the 64-character
+# account ids on every case...) dictionary-encoded, so each distinct value is stored once.
+# It is uncompressed on purpose, reading it is a memory map and not a parse.
+#
+# DataManager builds the SQLite cache from it whenever that cache has to be rebuilt (schema change,
+# deleted cache file) while the JSON is unchanged, skipping the JSON parse. The SHA-256 of the JSON
+# file is stored in the snapshot to know whether it is still current.
+# Without pyarrow everything keeps working as before, only without the snapshot.
+
+import json
+import os
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    pa = None
+
+# Bump when the snapshot layout changes
+SNAPSHOT_VERSION = 1
+SNAPSHOT_DIRNAME = "snapshot"
+BATCH_ROWS = 100_000
+
+# Stored as dictionary<int32, string>
+CATEGORICAL_COLUMNS = {
+    "cases": ("account_sfid", "case_product", "case_severity", "case_type", "case_status"),
+    "accounts": ("account_country", "account_industry"),
+}
+
+
+def available():
+    return pa is not None
+
+
+def format_timestamps(series):
+    # Back to the text SQLite stores ('YYYY-MM-DD HH:MM:SS', fraction only when there is one)
+    text = series.dt.strftime("%Y-%m-%d %H:%M:%S")
+    micro = series.dt.microsecond
+    fraction = micro.ne(0) & micro.notna()
+    if fraction.any():
+        text[fraction] = text[fraction] + "." + micro[fraction].astype("int64").astype(str).str.zfill(6)
+    return text.astype(object).where(series.notna(), None)
+
+
+def parse_timestamps(series):
+    # The text SQLite stores is ISO 8601 (normalize_timestamp), with or without a fraction
+    return pd.to_datetime(series, format="ISO8601", errors="coerce")
+
+
+class ArrowSnapshot:
+    def __init__(self, directory):
+        self.directory = directory
+
+    def path(self, table):
+        return self.directory / f"{table}.arrow"
+
+    def metadata(self, table):
+        try:
+            with pa.memory_map(str(self.path(table))) as source:
+                raw = pa.ipc.open_file(source).schema.metadata or {}
+            return json.loads(raw.get(b"snapshot", b"{}"))
+        except (OSError, pa.ArrowInvalid, ValueError):
+            return None
+
+    def matches(self, sources):
+        """sources: {table: (file name, sha256)} of the JSON files the database is built from."""
+        for table, (name, digest) in sources.items():
+            meta = self.metadata(table)
+            if not meta or meta.get("version") != SNAPSHOT_VERSION or meta.get("source") != name or meta.get("sha256") != digest:
+                return False
+        return True
+
+    def open(self, table):
+        """Memory-mapped pyarrow Table (no copy, pages are read on demand)."""
+        with pa.memory_map(str(self.path(table))) as source:
+            return pa.ipc.open_file(source).read_all()
+
+    def iter_frames(self, table, date_columns):
+        """DataFrames of BATCH_ROWS rows, dates as text again, ready to insert into SQLite."""
+        data = self.open(table)
+        for batch in data.to_batches(BATCH_ROWS):
+            df = batch.to_pandas()
+            for column in df.columns:
+                if column in date_columns and pd.api.types.is_datetime64_any_dtype(df[column]):
+                    df[column] = format_timestamps(df[column])
+                else:
+                    df[column] = df[column].astype(object).where(df[column].notna(), None)
+            yield df
+
+    def write(self, conn, table, source, date_columns):
+        """
+        Writes the rows of the (freshly loaded) SQLite table. source: (JSON file name, sha256).
+        Returns (rows written, date columns kept as text because some value isn't a date).
+        """
+        columns = [row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')]
+        categories = {
+            column: [v for (v,) in conn.execute(f'SELECT DISTINCT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL ORDER BY 1')]
+            for column in CATEGORICAL_COLUMNS.get(table, ()) if column in columns
+        }
+        # Decided over the whole column up front, every batch of the file must have the same schema
+        timestamps = {column for column in columns if column in date_columns and self._all_dates(conn, table, column)}
+        untyped = [column for column in columns if column in date_columns and column not in timestamps]
+        rows = 0
+        path = self.path(table)
+        tmp_path = path.with_name(path.name + ".tmp")
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+        writer = None
+        schema = None
+        try:
+            for df in pd.read_sql(f'SELECT * FROM "{table}"', conn, chunksize=BATCH_ROWS):
+                arrays = [self._column(df[c], c, categories, timestamps) for c in columns]
+                batch = pa.RecordBatch.from_arrays(arrays, names=columns)
+                if writer is None:
+                    meta = {"version": SNAPSHOT_VERSION, "source": source[0], "sha256": source[1]}
+                    schema = batch.schema.with_metadata({"snapshot": json.dumps(meta)})
+                    writer = pa.ipc.new_file(str(tmp_path), schema)
+                if not batch.schema.equals(schema, check_metadata=False):
+                    batch = batch.cast(schema) # e.g. an int column that came back as float in a chunk with NULLs
+                writer.write_batch(batch)
+                rows += len(df)
+        except Exception:
+            if writer is not None:
+                writer.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+        if writer is None: # empty table
+            return 0, untyped
+        writer.close()
+
+        os.replace(tmp_path, path)
+        return rows, untyped
+
+    @staticmethod
+    def _all_dates(conn, table, column):
+        query = f'SELECT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL'
+        for df in pd.read_sql(query, conn, chunksize=BATCH_ROWS):
+            if parse_timestamps(df[column]).isna().any():
+                return False
+        return True
+
+    @staticmethod
+    def _column(series, column, categories, timestamps):
+        if column in categories:
+            # Same dictionary in every batch, the IPC file format doesn't allow it to change
+            values = pd.Categorical(series.astype(object).where(series.notna(), None), categories=categories[column])
+            return pa.DictionaryArray.from_arrays(pa.array(values.codes, type=pa.int32(), mask=values.codes < 0),
+                                                  pa.array(categories[column], type=pa.string()))
+        if column in timestamps:
+            return pa.array(parse_timestamps(series).astype("datetime64[us]"), type=pa.timestamp("us"))
+        if series.dtype == object or pd.api.types.is_string_dtype(series):
+            return pa.array(series.astype(object).where(series.notna(), None).map(lambda v: v if v is None else str(v)), type=pa.string())
+        return pa.array(series)
@@ -0,0 +1,185 @@
+# Seeded generator for fake support_cases / accounts JSON files, shaped like the real export
+# (same fields, same text formats) but of any size, for benchmarks (bench_suite.py).
+# The same seed and size always give the same files.
+#
+# Skew roughly follows the real data: a long tail of products, a few very common case types and severities,
+# most accounts in the US, ticket volume growing over time with quiet weekends,
+# and resolution times with a long tail (urgent cases close faster).
+#
+# Usage (from the src folder):
+#   python synthetic_data.py <out_dir> <n_cases> [--accounts N] [--seed S]
+
+import argparse
+import hashlib
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from data_manager import STREAM_BATCH_ROWS
+
+CASES_FILENAME = "support_cases_anonymized.json"
+ACCOUNTS_FILENAME = "accounts_anonymized.json"
+
+# Real export: ~14 cases per account
+CASES_PER_ACCOUNT = 14
+
+PRODUCTS = [f"Product {letter}" for letter in "ABCDEFGHIJKL"]
+PRODUCT_WEIGHTS = 0.9 ** np.arange(len(PRODUCTS))
+
+SEVERITIES = ["Urgent", "High", "Medium", "Normal", "Low"]
+# Most tickets are Medium / Normal, Urgent is a thin tail
+SEVERITY_WEIGHTS = np.array([3, 12, 40, 35, 10])
+# Median resolution hours per severity
+SEVERITY_RESOLUTION_HOURS = np.array([10.0, 20.0, 30.0, 40.0, 50.0])
+
+CASE_TYPES = ["Question", "Bug", "Training", "License", "Defect", "Feature Request", "Other A", "Other B"]
+CASE_TYPE_WEIGHTS = np.array([30, 20, 15, 10.5, 10, 9.5, 3, 2])
+
+STATUSES = ["Closed", "Open", "In Progress"]
+STATUS_WEIGHTS = np.array([81, 10, 9])
+
+COUNTRIES = [
+    "United States", "China", "Canada", "India", "United Kingdom", "Germany", "Spain", "South Korea",
+    "France", "Brazil", "Japan", "Italy", "Mexico", "Australia", "Netherlands", "Poland", "Pakistan",
+    "Sweden", "Switzerland", "Turkey", "Argentina", "Belgium", "Singapore", "South Africa", "Israel",
+    "Ireland", "Denmark", "Norway", "Portugal", "Chile", "Colombia", "Vietnam", "Thailand", "Egypt",
+]
+# The US alone is ~40% of the accounts, the rest a Zipf-like tail
+COUNTRY_WEIGHTS = np.concatenate([[0.4 * sum(1 / np.arange(2, len(COUNTRIES) + 1)) / 0.6], 1 / np.arange(2, len(COUNTRIES) + 1)])
+
+INDUSTRIES = [
+    "Pharmaceuticals", "Printing", "Packaging and Containers", "Household & Personal Products",
+    "Food & Beverage", "Advertising & Branding Agency", "Medical Devices", "Other", "Information Technology",
+    "Chemicals", "Materials", "Financials", "Advertising", "Food", "Government", "Education",
+]
+INDUSTRY_WEIGHTS = np.array([421, 265, 252, 86, 78, 66, 60, 56, 29, 27, 17, 13, 7, 7, 5, 1])
+
+CASES_START = np.datetime64("2023-01-01")
+CASES_DAYS = 400
+ACCOUNTS_START = np.datetime64("2007-11-01")
+ACCOUNTS_DAYS = 6275
+# Volume at the end of the range compared to the start
+VOLUME_GROWTH = 1.5
+WEEKEND_FACTOR = 0.35
+
+CHUNK_ROWS = STREAM_BATCH_ROWS * 10
+
+
+def _pick(rng, values, weights, size):
+    weights = np.asarray(weights, dtype=float)
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=size, p=weights / weights.sum())]
+
+
+def _timestamps(start, seconds):
+    # 'YYYY-MM-DD HH:MM:SS', like the real export
+    text = np.datetime_as_string(start + seconds.astype("timedelta64[s]"), unit="s")
+    return np.char.replace(text, "T", " ").astype(object)
+
+
+def _sfid(kind, i):
+    return hashlib.sha256(f"{kind}{i}".encode()).hexdigest()
+
+
+def day_weights(days=CASES_DAYS):
+    t = np.arange(days)
+    growth = 1 + (VOLUME_GROWTH - 1) * t / max(days - 1, 1)
+    weekday = (CASES_START.astype("datetime64[D]").view("int64") + t + 3) % 7 # 0 = Monday
+    return growth * np.where(weekday >= 5, WEEKEND_FACTOR, 1.0)
+
+
+def _write_array(path, records):
+    # One record per line, streamed so a 10M row file never sits in memory
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[\n")
+        first = True
+        for chunk in records:
+            if not chunk:
+                continue
+            if not first:
+                f.write(",\n")
+            f.write(",\n".join(chunk))
+            first = False
+        f.write("\n]\n")
+
+
+def account_chunks(rng, n_accounts):
+    for lo in range(0, n_accounts, CHUNK_ROWS):
+        n = min(CHUNK_ROWS, n_accounts - lo)
+        countries = _pick(rng, COUNTRIES, COUNTRY_WEIGHTS, n)
+        industries = _pick(rng, INDUSTRIES, INDUSTRY_WEIGHTS, n)
+        created = _timestamps(ACCOUNTS_START, rng.integers(0, ACCOUNTS_DAYS * 86400, n))
+        yield [
+            json.dumps({
+                "account_sfid": _sfid("account", lo + i),
+                "account_name": f"Customer_{_sfid('name', lo + i)[:8]}",
+                "account_created_date": created[i],
+                "account_country": countries[i],
+                "account_industry": industries[i],
+            })
+            for i in range(n)
+        ]
+
+
+def case_chunks(rng, n_cases, n_accounts):
+    # Some accounts open many more tickets than others
+    account_weights = rng.lognormal(0, 0.5, n_accounts)
+    account_weights /= account_weights.sum()
+    days = day_weights()
+    days /= days.sum()
+
+    for lo in range(0, n_cases, CHUNK_ROWS):
+        n = min(CHUNK_ROWS, n_cases - lo)
+        accounts = rng.choice(n_accounts, size=n, p=account_weights)
+        products = _pick(rng, PRODUCTS, PRODUCT_WEIGHTS, n)
+        severity_idx = rng.choice(len(SEVERITIES), size=n, p=SEVERITY_WEIGHTS / SEVERITY_WEIGHTS.sum())
+        types = _pick(rng, CASE_TYPES, CASE_TYPE_WEIGHTS, n)
+        statuses = _pick(rng, STATUSES, STATUS_WEIGHTS, n)
+
+        created_s = rng.choice(CASES_DAYS, size=n, p=days) * 86400 + rng.integers(0, 86400, n)
+        # Long-tailed resolution time around the severity's median
+        resolution_s = (SEVERITY_RESOLUTION_HOURS[severity_idx] * rng.lognormal(0, 1.0, n) * 3600).astype(np.int64)
+        created = _timestamps(CASES_START, created_s)
+        closed = _timestamps(CASES_START, created_s + resolution_s)
+
+        yield [
+            json.dumps({
+                "case_sfid": _sfid("", lo + i),
+                "account_sfid": _sfid("account", accounts[i]),
+                "case_number": 100000 + lo + i,
+                "case_product": products[i],
+                "case_severity": SEVERITIES[severity_idx[i]],
+                "case_type": types[i],
+                "case_status": statuses[i],
+                "case_created_date": created[i],
+                "case_closed_date": closed[i] if statuses[i] == "Closed" else None,
+            })
+            for i in range(n)
+        ]
+
+
+def generate(out_dir, n_cases, n_accounts=None, seed=0):
+    """Writes both JSON files into out_dir. Returns (cases path, accounts path)."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    n_accounts = n_accounts or max(50, n_cases // CASES_PER_ACCOUNT)
+    rng = np.random.default_rng(seed)
+
+    start = time.perf_counter()
+    accounts_path = out_dir / ACCOUNTS_FILENAME
+    cases_path = out_dir / CASES_FILENAME
+    _write_array(accounts_path, account_chunks(rng, n_accounts))
+    _write_array(cases_path, case_chunks(rng, n_cases, n_accounts))
+    print(f"Generated {n_cases} cases / {n_accounts} accounts in {out_dir} ({time.perf_counter() - start:.1f}s)")
+    return cases_path, accounts_path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write synthetic support cases / accounts JSON files.")
+    parser.add_argument("out_dir")
+    parser.add_argument("n_cases", type=int)
+    parser.add_argument("--accounts", type=int, default=None, help=f"default: n_cases / {CASES_PER_ACCOUNT}")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    generate(args.out_dir, args.n_cases, args.accounts, args.seed)
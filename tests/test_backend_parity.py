@@ -0,0 +1,40 @@
+# All nine reports must come out identical on the DuckDB query backend and on SQLite
+# (same check as "python src/bench_backends.py parity", on a small synthetic dataset).
+# Skipped when duckdb is not installed. Run from the repository root: python -m pytest tests
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+pytest.importorskip("duckdb")
+
+from bench_backends import differences, load
+from graphs import GraphLibrary, REPORT_KEYS
+from synthetic_data import generate
+
+N_CASES = 5000
+
+
+@pytest.fixture(scope="module")
+def reports(tmp_path_factory):
+    data_dir = tmp_path_factory.mktemp("data")
+    generate(data_dir, N_CASES, seed=1)
+    cache_path = data_dir / "parity.sqlite"
+
+    results = {}
+    for backend in ("sqlite", "duckdb"):
+        dm = load(backend, data_dir, cache_path) # the first load builds the database, duckdb reads the same file
+        assert dm.backend.name == backend
+        graphs = GraphLibrary(dm)
+        results[backend] = {key: graphs.compute(key) for key in REPORT_KEYS}
+        dm.backend.close()
+        dm.conn.close()
+    return results
+
+
+@pytest.mark.parametrize("key", REPORT_KEYS)
+def test_report_parity(reports, key):
+    assert differences(reports["sqlite"][key], reports["duckdb"][key], key) == []